@@ -0,0 +1,125 @@
+import os
+import re
+import json
+import itertools
+import numpy as np
+import pandas as pd
+from row_store import is_text
+
+# Per-segment aggregate tables built when a segment is written: for every
+# dimension (text columns with few distinct values, booleans, and dates, with
+# timestamps truncated to the day) and every pair of dimensions, the row count
+# and the count/sum/min/max of each numeric column per group. Counts and sums
+# add up across segments, so a collection's answer is the sum of its
+# segments' tables.
+
+SPEC_FILE = "cubes.json"
+CUBE_MAX_CARDINALITY = int(os.getenv("CUBE_MAX_CARDINALITY", "1000"))
+# pairs of dimensions that could produce more groups than this are skipped
+CUBE_MAX_GROUPS = int(os.getenv("CUBE_MAX_GROUPS", "50000"))
+STATS = ("n", "sum", "min", "max")
+DATE = re.compile(r"^\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2})?)?$")
+
+# checks a sample first so long lists of ids are rejected quickly
+def looks_like_dates(strings):
+    return bool(strings) and all(DATE.match(s) for s in strings[:100]) and all(DATE.match(s) for s in strings)
+
+# name -> (codes, labels, is_date); rows without a value have code -1
+def dimensions(rows):
+    dims = {}
+    for i, col in enumerate(rows.columns):
+        if col["kind"] == "bool":
+            values = np.asarray(rows.array(i, "values", "float64"))
+            codes = np.where(np.isnan(values), -1, np.nan_to_num(values)).astype("int64")
+            dims[col["name"]] = (codes, ["False", "True"], False)
+        elif is_text(col):
+            strings = rows.strings(i)
+            codes = np.asarray(rows.array(i, "codes", "int32")).astype("int64")
+            if looks_like_dates(strings):
+                days, inverse = np.unique([s[:10] for s in strings], return_inverse=True)
+                codes = np.where(codes >= 0, inverse[np.maximum(codes, 0)], -1)
+                dims[col["name"]] = (codes, days.tolist(), True)
+            elif len(strings) <= CUBE_MAX_CARDINALITY:
+                dims[col["name"]] = (codes, strings, False)
+    return dims
+
+def measures(rows):
+    return {c["name"]: np.asarray(rows.array(i, "values", "float64"))
+            for i, c in enumerate(rows.columns) if c["kind"] in ("int", "float")}
+
+# {dim: labels per group, "count": rows per group, "<measure>.<stat>": ...}
+def group(names, dims, values, n):
+    valid = np.ones(n, dtype=bool)
+    for d in names:
+        valid &= dims[d][0] >= 0
+    keys = [f"__key{j}" for j in range(len(names))] or ["__all"]
+    frame = pd.DataFrame({k: dims[d][0][valid] for k, d in zip(keys, names)} if names
+                         else {"__all": np.zeros(int(valid.sum()), dtype="int8")})
+    for name, v in values.items():
+        frame[name] = v[valid]
+    grouped = frame.groupby(keys, sort=True)
+    counts = grouped.size()
+    data = {}
+    for j, d in enumerate(names):
+        codes = counts.index.get_level_values(j).to_numpy()
+        data[d] = np.asarray(dims[d][1], dtype=object)[codes].tolist()
+    data["count"] = counts.to_numpy().astype(float).tolist()
+    if values:
+        stats = grouped[list(values)].agg(["count", "sum", "min", "max"])
+        for name in values:
+            for stat, agg in zip(STATS, ("count", "sum", "min", "max")):
+                data[f"{name}.{stat}"] = [None if pd.isna(x) else float(x) for x in stats[(name, agg)]]
+    return data
+
+def build(rows, path):
+    n = len(rows)
+    dims = dimensions(rows)
+    values = measures(rows)
+    cubes = []
+    for size in (0, 1, 2):
+        for names in itertools.combinations(dims, size):
+            if np.prod([len(dims[d][1]) for d in names]) > CUBE_MAX_GROUPS:
+                continue
+            cubes.append({"dims": list(names), "data": group(names, dims, values, n)})
+    spec = {"rows": n, "dims": {d: {"date": dims[d][2], "values": dims[d][1]} for d in dims},
+            "measures": list(values), "cubes": cubes}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(spec, f)
+    os.replace(tmp, path)
+    return Cubes(path)
+
+class Cubes:
+    def __init__(self, path):
+        with open(path, "r") as f:
+            spec = json.load(f)
+        self.rows = spec["rows"]
+        self.dims = spec["dims"]
+        self.measures = spec["measures"]
+        self.cubes = {frozenset(c["dims"]): pd.DataFrame(c["data"]) for c in spec["cubes"]}
+
+    # the table grouped by exactly these dimensions, None when it was skipped
+    def table(self, dims):
+        return self.cubes.get(frozenset(dims))
+
+# Combines the segments' tables: keeps the groups matching filters
+# ({dim: [values]}) and regroups by group_by. Returns a frame with the group
+# columns, count and the merged stats, or None when a segment lacks the table.
+def combine(segment_cubes, group_by, filters):
+    dims = list(dict.fromkeys(list(group_by) + list(filters)))
+    parts = []
+    for cubes in segment_cubes:
+        table = cubes.table(dims)
+        if table is None:
+            return None
+        for dim, allowed in filters.items():
+            table = table[table[dim].isin(allowed)]
+        parts.append(table)
+    frame = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    if frame.empty:
+        return frame
+    stats = [c for c in frame.columns if c not in dims]
+    how = {c: ("min" if c.endswith(".min") else "max" if c.endswith(".max") else "sum") for c in stats}
+    if group_by:
+        return frame.groupby(list(group_by), sort=True).agg(how).reset_index()
+    return frame.agg(how).to_frame().T
@@ -0,0 +1,240 @@
+import os
+import re
+import calendar
+import numpy as np
+from charts import AGGREGATES, COLUMN_SYNONYMS
+
+# "phrase" has the LLM word the result computed from the precomputed tables,
+# "direct" returns it as the answer, "off" sends every question through
+# retrieval
+AGGREGATE_ANSWERS = os.getenv("AGGREGATE_ANSWERS", "phrase")
+MAX_GROUP_LINES = 50
+
+OPS = [(r"\b(total|sum)\b", "sum")] + AGGREGATES
+OPEN_ENDED = re.compile(r"\b(why|explain|describe|summari[sz]e|recommend|suggest|should|insight|trend)\b")
+# comparisons between values would get one combined figure
+COMPARISON = re.compile(r"\b(than|versus|vs|compared?|comparing|comparison|difference|differ|between|"
+                        r"higher|lower|more|less|greater|bigger|smaller|larger)\b")
+GROUP_WORDS = r"(?:per|by|for each|for every|each|across)\s+(?:the\s+)?"
+DAILY = re.compile(r"\b(?:daily|per day|by day|each day|per date|by date)\b")
+PREFIXES = re.compile(r"^(?:no of|number of|count of|sum of|total)\s+")
+SUFFIXES = re.compile(r"\s+(?:name|description)$")
+MONTHS = {m.lower(): i for i, m in enumerate(calendar.month_name) if m}
+MONTHS.update({m.lower(): i for i, m in enumerate(calendar.month_abbr) if m})
+MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+# "may" on its own is usually the verb
+PERIOD_MONTH = "|".join(m for m in sorted(MONTHS, key=len, reverse=True) if m != "may") + r"|may(?=\s+\d{4})"
+# periods the day tables cannot filter on: a month or year without a day,
+# and relative dates
+PERIOD = re.compile(
+    rf"\b(?:(?:{PERIOD_MONTH})\b|(?:19|20)\d{{2}}(?:-\d{{2}})?\b"
+    r"|(?:last|this|next|previous|past)\s+(?:day|week|month|quarter|year)s?\b|yesterday|today|ytd|mtd|quarter|q[1-4]\b)")
+TEXT_DATE = re.compile(
+    rf"\b(?:(?P<m1>{MONTH})\.?\s+(?P<d1>\d{{1,2}})(?:st|nd|rd|th)?|(?P<d2>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<m2>{MONTH}))"
+    rf"(?:,?\s+(?P<y>\d{{4}}))?\b")
+
+def normalize(name):
+    return re.sub(r"[_\s]+", " ", str(name)).strip().lower()
+
+def phrase_pattern(text):
+    return re.compile(r"(?<!\w)" + r"[_\s]+".join(re.escape(w) for w in text.split()) + r"(?!\w)")
+
+# the name with its last word in the other number: "balance" <-> "balances"
+def inflect(name):
+    head, _, last = name.rpartition(" ")
+    if re.search(r"[^aeiou]ies$", last):
+        last = last[:-3] + "y"
+    elif re.search(r"(?:x|ch|sh|ss)es$", last):
+        last = last[:-2]
+    elif last.endswith("s") and not last.endswith("ss"):
+        last = last[:-1]
+    elif re.search(r"[^aeiou]y$", last):
+        last = last[:-1] + "ies"
+    elif re.search(r"(?:x|ch|sh|ss)$", last):
+        last += "es"
+    else:
+        last += "s"
+    return f"{head} {last}".strip()
+
+def aliases(column):
+    name = normalize(column)
+    found = {name, PREFIXES.sub("", name), SUFFIXES.sub("", name)}
+    found.update(word for word, target in COLUMN_SYNONYMS.items() if target == column)
+    found.update([inflect(a) for a in found if a])
+    return [a for a in found if a]
+
+# (start, end, column) of every mention of the columns, longest first
+def mentions(text, columns):
+    found = []
+    for column in columns:
+        for alias in aliases(column):
+            for m in phrase_pattern(alias).finditer(text):
+                found.append((m.start(), m.end(), column))
+    return sorted(found, key=lambda f: f[0] - f[1])
+
+# longest mentions first, dropping any that overlap one already taken, so
+# "balance tier" is the dimension and not the measure "balance"
+def resolve(text, dims, measures):
+    taken = []
+    for start, end, column in mentions(text, list(measures) + list(dims)):
+        if all(end <= s or start >= e for s, e, _ in taken):
+            taken.append((start, end, column))
+    return sorted(taken)
+
+def is_flag(spec):
+    return not spec["date"] and list(spec["values"]) == ["False", "True"]
+
+# boolean columns are named after what they flag ("customer_flagged"), so the
+# last word alone ("flagged customers") counts as a mention
+def flag_mentioned(text, column):
+    words = normalize(column).split()
+    return bool(words) and (any(phrase_pattern(a).search(text) for a in aliases(column))
+                            or re.search(rf"\b{re.escape(words[-1])}s?\b", text) is not None)
+
+def blank(text, start, end):
+    return text[:start] + " " * (end - start) + text[end:]
+
+# -> (dates named in the text, the matching values), or None when none are named
+def date_filter(text, values):
+    wanted, named = [], []
+    for match in ISO_DATE.finditer(text):
+        wanted.append(match.groups())
+        named.append(match.group(0))
+    for match in TEXT_DATE.finditer(text):
+        month = MONTHS[(match["m1"] or match["m2"]).lower()]
+        day = int(match["d1"] or match["d2"])
+        wanted.append((match["y"], f"{month:02d}", f"{day:02d}"))
+        named.append(match.group(0).strip())
+    if not wanted:
+        return None
+    return named, sorted(v for v in values if any(v[5:7] == m and v[8:10] == d and (not y or v[:4] == y)
+                                                  for y, m, d in wanted))
+
+# -> {"op", "measure", "group_by", "filters", "rank"} for questions the
+# tables can answer, otherwise None
+def parse(question, dims, measures):
+    text = question.lower()
+    if OPEN_ENDED.search(text):
+        return None
+    measure, measure_text = None, ""
+    group_by, filters, named, ranked = [], {}, [], False
+    for start, end, column in resolve(text, dims, measures):
+        if column in measures:
+            if measure is None or end - start > len(measure_text):
+                measure, measure_text = column, text[start:end]
+            text = blank(text, start, end)
+            continue
+        which = re.search(r"\b(?:which|what)\s+$", text[:start])
+        if which or re.search(GROUP_WORDS + r"$", text[:start]):
+            if column not in group_by:
+                group_by.append(column)
+            ranked = ranked or bool(which)
+            text = blank(text, start, end)
+    dates = [d for d, spec in dims.items() if spec["date"]]
+    if dates and DAILY.search(text) and not any(d in group_by for d in dates):
+        group_by.append(dates[0])
+
+    for dim, spec in dims.items():
+        if spec["date"]:
+            continue
+        for value in sorted((v for v in spec["values"] if len(v) > 1 and v not in ("True", "False")),
+                            key=len, reverse=True):
+            pattern = phrase_pattern(value.lower())
+            m = pattern.search(text)
+            while m:
+                filters.setdefault(dim, []).append(value)
+                text = blank(text, m.start(), m.end())
+                m = pattern.search(text)
+    if dates:
+        mentioned = {c for _, _, c in mentions(question.lower(), dates)}
+        date_dim = next((d for d in dates if d in mentioned), dates[0])
+        days = date_filter(text, dims[date_dim]["values"])
+        if days is not None:
+            named, filters[date_dim] = days
+
+    # parts of the question the tables would silently ignore: comparisons,
+    # month or year periods, and yes/no columns not grouped by
+    if COMPARISON.search(text) or PERIOD.search(TEXT_DATE.sub(" ", ISO_DATE.sub(" ", text))):
+        return None
+    if any(is_flag(spec) and d not in group_by and flag_mentioned(text, d) for d, spec in dims.items()):
+        return None
+
+    op = next((func for pattern, func in OPS if re.search(pattern, text)), None)
+    if op is None and re.search(r"\b(total|sum)\b", measure_text):
+        op = "sum"
+    if op == "count" and measure:
+        op = "sum"
+    # "which unit has the highest balance" ranks the units by their total
+    rank = None
+    if ranked:
+        rank = "min" if op == "min" else "max"
+        if op in ("max", "min", None):
+            op = "sum"
+    if op is None or (op != "count" and not measure):
+        return None
+    if len(set(group_by) | set(filters)) > 2:
+        return None
+    return {"op": op, "measure": measure, "group_by": group_by, "filters": filters, "rank": rank, "dates": named}
+
+def number(v):
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return "n/a"
+    if float(v).is_integer():
+        return f"{int(v):,}"
+    return f"{v:,.2f}"
+
+def values_of(frame, op, measure):
+    if op == "count":
+        return frame["count"].to_numpy(dtype=float)
+    if op == "mean":
+        n = frame[f"{measure}.n"].to_numpy(dtype=float)
+        return np.divide(frame[f"{measure}.sum"].to_numpy(dtype=float), n,
+                         out=np.full(len(n), np.nan), where=n > 0)
+    return frame[f"{measure}.{op}"].to_numpy(dtype=float)
+
+OP_NAMES = {"sum": "Total", "mean": "Average", "min": "Minimum", "max": "Maximum", "count": "Number of rows"}
+# leading words of a measure name that already say the operation
+OP_WORDS = {"sum": ("total", "sum"), "mean": ("average", "avg", "mean"),
+            "min": ("minimum", "min"), "max": ("maximum", "max")}
+
+def describe(intent):
+    label = OP_NAMES[intent["op"]]
+    if intent["op"] != "count":
+        words = normalize(intent["measure"]).split()
+        if len(words) > 1 and words[0] in OP_WORDS[intent["op"]]:
+            words = words[1:]
+        label += " " + " ".join(words)
+    where = [f"{d} = {', '.join(v or intent['dates']) if len(v) <= 3 else f'{len(v)} values'}"
+             for d, v in intent["filters"].items()]
+    return label + (f" where {'; '.join(where)}" if where else "")
+
+# the answer as text, or None when the question is not a recognized aggregate
+def answer(store, question):
+    dims, measures = store.dimensions()
+    intent = parse(question, dims, measures)
+    if intent is None:
+        return None
+    if any(not v for v in intent["filters"].values()):
+        return f"{describe(intent)}: no matching rows."
+    frame = store.aggregate(intent["group_by"], intent["filters"])
+    if frame is None:
+        return None
+    if frame.empty:
+        return f"{describe(intent)}: no matching rows."
+    values = values_of(frame, intent["op"], intent["measure"])
+    if not intent["group_by"]:
+        return f"{describe(intent)}: {number(values[0])} (from {number(frame['count'].iloc[0])} rows)."
+    keys = [" / ".join(str(k) for k in row) for row in frame[intent["group_by"]].itertuples(index=False)]
+    order = np.arange(len(keys))
+    if intent["rank"]:
+        order = np.argsort(-values if intent["rank"] == "max" else values, kind="stable")
+    lines = [f"{describe(intent)} by {', '.join(intent['group_by'])}:"]
+    if intent["rank"]:
+        best = order[0]
+        word = "highest" if intent["rank"] == "max" else "lowest"
+        lines = [f"{keys[best]} has the {word} {describe(intent).lower()}: {number(values[best])}.", lines[0]]
+    lines += [f"{keys[i]}: {number(values[i])}" for i in order[:MAX_GROUP_LINES]]
+    if len(keys) > MAX_GROUP_LINES:
+        lines.append(f"... and {len(keys) - MAX_GROUP_LINES} more groups")
+    return "\n".join(lines)
@@ -0,0 +1,160 @@
+import os
+import json
+import re
+import numpy as np
+from datetime import datetime, date
+from row_store import is_text
+
+# Per-segment secondary indexes, built once when a segment is written:
+#   text columns    -> hash index: row ids grouped by dictionary code
+#                      (<i>.postings int32, <i>.starts int64 offsets per code)
+#   numeric columns -> sorted index: row ids ordered by value
+#                      (<i>.sorted int32, <i>.keys float64)
+#   ISO date text   -> an additional sorted index keyed by days since epoch
+
+SPEC_FILE = "attrs.json"
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+EPOCH = np.datetime64(0, "D")
+
+def to_days(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    return float((np.datetime64(value, "D") - EPOCH).astype("int64"))
+
+def iso_days(strings):
+    if not strings or not all(ISO_DATE.match(s) for s in strings):
+        return None
+    try:
+        return (np.array(strings, dtype="datetime64[D]") - EPOCH).astype("float64")
+    except ValueError:
+        return None
+
+def write_sorted(path, i, values):
+    present = np.flatnonzero(~np.isnan(values))
+    order = present[np.argsort(values[present], kind="stable")]
+    order.astype("int32").tofile(os.path.join(path, f"{i}.sorted"))
+    values[order].astype("float64").tofile(os.path.join(path, f"{i}.keys"))
+
+def build(rows, path):
+    os.makedirs(path, exist_ok=True)
+    spec = {}
+    for i, col in enumerate(rows.columns):
+        if is_text(col):
+            codes = np.asarray(rows.array(i, "codes", "int32"))
+            strings = rows.strings(i)
+            order = np.argsort(codes, kind="stable")
+            # missing values (code -1) sort first and are not indexed
+            order[int((codes < 0).sum()):].astype("int32").tofile(os.path.join(path, f"{i}.postings"))
+            counts = np.bincount(codes[codes >= 0], minlength=len(strings))
+            np.concatenate([[0], np.cumsum(counts)]).astype("int64").tofile(os.path.join(path, f"{i}.starts"))
+            spec[col["name"]] = {"position": i, "type": "hash"}
+            days = iso_days(strings)
+            if days is not None:
+                write_sorted(path, i, np.append(days, np.nan)[codes])
+                spec[col["name"]]["dates"] = True
+        else:
+            write_sorted(path, i, np.array(rows.array(i, "values", "float64")))
+            spec[col["name"]] = {"position": i, "type": "sorted"}
+    tmp = os.path.join(path, SPEC_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(spec, f)
+    os.replace(tmp, os.path.join(path, SPEC_FILE))
+    return AttributeIndex(rows, path)
+
+def key_range(op, value):
+    if op == "between":
+        return value[0], value[1]
+    if op in ("=", "=="):
+        return value, value
+    if op in (">", ">="):
+        return value, np.inf
+    if op in ("<", "<="):
+        return -np.inf, value
+    return None
+
+def numeric(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class AttributeIndex:
+    def __init__(self, rows, path):
+        self.rows = rows
+        self.path = path
+        with open(os.path.join(path, SPEC_FILE), "r") as f:
+            self.spec = json.load(f)
+        self.maps = {}
+        self.lookups = {}
+
+    def array(self, i, suffix, dtype):
+        key = (i, suffix)
+        if key not in self.maps:
+            path = os.path.join(self.path, f"{i}.{suffix}")
+            if os.path.getsize(path) == 0:
+                self.maps[key] = np.zeros(0, dtype=dtype)
+            else:
+                self.maps[key] = np.memmap(path, dtype=dtype, mode="r")
+        return self.maps[key]
+
+    def codes_for(self, i, value):
+        if i not in self.lookups:
+            lookup = {}
+            for code, s in enumerate(self.rows.strings(i)):
+                lookup.setdefault(s.lower(), []).append(code)
+            self.lookups[i] = lookup
+        return self.lookups[i].get(str(value).strip().lower(), [])
+
+    # whether value is one of a text column's values
+    def knows(self, name, value):
+        entry = self.spec.get(name)
+        return entry is not None and entry["type"] == "hash" and bool(self.codes_for(entry["position"], value))
+
+    def hash_match(self, i, value):
+        postings = self.array(i, "postings", "int32")
+        starts = self.array(i, "starts", "int64")
+        parts = [postings[starts[c]:starts[c + 1]] for c in self.codes_for(i, value)]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype="int32")
+
+    def sorted_match(self, i, op, lo, hi):
+        keys = self.array(i, "keys", "float64")
+        start = np.searchsorted(keys, lo, side="right" if op == ">" else "left")
+        end = np.searchsorted(keys, hi, side="left" if op == "<" else "right")
+        return self.array(i, "sorted", "int32")[start:max(start, end)]
+
+    # row ids matching one filter, or None when the filter cannot be answered
+    # from the index and should not restrict the candidates
+    def match(self, name, op, value):
+        entry = self.spec.get(name)
+        if entry is None:
+            return np.zeros(0, dtype="int32")
+        i = entry["position"]
+        is_date = isinstance(value, (datetime, date)) or (
+            op == "between" and isinstance(value[0], (datetime, date)))
+        if is_date:
+            if entry.get("dates"):
+                bounds = key_range(op, tuple(to_days(v) for v in value) if op == "between" else to_days(value))
+                return self.sorted_match(i, op, *bounds)
+            if op in ("=", "=="):
+                return self.hash_match(i, value.strftime("%Y-%m-%d"))
+            return None
+        if entry["type"] == "hash":
+            if op in ("=", "=="):
+                return self.hash_match(i, value)
+            return None
+        bounds = key_range(op, tuple(numeric(v) for v in value) if op == "between" else numeric(value))
+        if bounds is None or None in bounds:
+            return np.zeros(0, dtype="int32") if op in ("=", "==") else None
+        return self.sorted_match(i, op, *bounds)
+
+    def candidates(self, filters):
+        ids = None
+        for name, op, value in filters:
+            matched = self.match(name, op, value)
+            if matched is None:
+                continue
+            matched = np.unique(matched)
+            ids = matched if ids is None else np.intersect1d(ids, matched, assume_unique=True)
+            if not len(ids):
+                break
+        return ids
@@ -0,0 +1,68 @@
+import os
+import string
+import numpy as np
+import pandas as pd
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+CHUNK = 100_000
+
+BUSINESS_UNITS = ["BRI", "Bank America", "Bank Mandiri"] + [f"Unit {c}" for c in "ABCDEHIJKLMNOPQRTUVXZ"]
+PARTNERS = [f"Partner {c}" for c in string.ascii_uppercase]
+TIERS = [
+    "T00: 0 IDR", "T01: 0 to <250K IDR", "T02: 250K to <500K IDR", "T03: 500K to <1M IDR",
+    "T04: 1M to <5M IDR", "T05: 5M to <25M IDR", "T06: 25M to <100M IDR", "T07: 100M to <500M IDR",
+    "T08: 500M to <1B IDR", "T09: 1B to <2B IDR", "T10: >=2B IDR",
+]
+DAILY_UNITS = ["Corporate", "Islamic Banking", "Retail", "SME"]
+DAILY_PARTNERS = ["Partner A", "Partner B", "Partner C", "Partner D"]
+
+def dates(rng, n, start, days):
+    return (np.datetime64(start) + rng.integers(0, days, n)).astype(str)
+
+def timestamps(rng, n, start, days):
+    seconds = rng.integers(0, days * 86400, n).astype("timedelta64[s]")
+    return pd.Series(np.datetime64(start, "s") + seconds).dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+
+# same columns and value ranges as dummy_data/balance_data.csv
+def balance_chunk(rng, first, n):
+    return pd.DataFrame({
+        "business_date": dates(rng, n, "2025-01-01", 90),
+        "business_unit": rng.choice(BUSINESS_UNITS, n),
+        "customer_flagged": rng.random(n) < 0.5,
+        "partner_name": rng.choice(PARTNERS, n),
+        "balance_tier_description": rng.choice(TIERS, n),
+        "no_of_customers": rng.integers(10, 480, n),
+        "total_balance": np.round(rng.random(n) * 1e10, 2),
+        "unique_id": [f"UID-{i:08d}" for i in range(first, first + n)],
+        "record_inserted_at": timestamps(rng, n, "2025-01-01", 90),
+    })
+
+# same columns and value ranges as dummy_data/daily_data.csv
+def daily_chunk(rng, first, n):
+    return pd.DataFrame({
+        "Amaan vs Non-Amaan": rng.choice(["Sharia Amaan", "Sharia Non-Amaan"], n),
+        "business_date": dates(rng, n, "2024-01-01", 366),
+        "business_unit": rng.choice(DAILY_UNITS, n),
+        "customer_flagged": rng.integers(0, 2, n),
+        "eom_flagged": rng.integers(0, 2, n),
+        "new_acquired_unique_customers": rng.integers(18, 500, n),
+        "partner_name": rng.choice(DAILY_PARTNERS, n),
+        "partner_name_total": rng.integers(138, 4725, n),
+        "total_unique_customers": rng.integers(631, 10000, n),
+        "Record Count": rng.integers(1, 99, n),
+        "Weekly Average": np.round(rng.uniform(11, 481, n), 2),
+    })
+
+KINDS = {"balance_data": balance_chunk, "daily_data": daily_chunk}
+
+def generate(kind, rows, folder, seed=0):
+    path = os.path.join(folder, f"{kind}_{rows}.csv")
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    tmp = path + ".tmp"
+    for first in range(0, rows, CHUNK):
+        chunk = KINDS[kind](rng, first, min(CHUNK, rows - first))
+        chunk.to_csv(tmp, mode="a", header=first == 0, index=False)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,89 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ANSWER = ("1. The selected rows show steady balances across business units. "
+          "2. Partner C has the highest total balance. 3. Customer counts are stable.")
+SQL = "SELECT business_unit, SUM(total_balance) AS total_balance FROM balance_data GROUP BY business_unit"
+
+# Answers /api/chat and /api/generate like Ollama, emitting one word every
+# token_latency seconds (streamed or not). Prompts asking for SQL get a
+# fixed aggregate query so the text-to-SQL path can be exercised.
+class FakeOllama:
+    def __init__(self, token_latency=0.01, prompt_latency=0.0, port=0):
+        self.token_latency = token_latency
+        self.prompt_latency = prompt_latency
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake.requests += 1
+                fake.answer(self, body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def text_for(self, body):
+        prompt = body.get("prompt") or body.get("messages", [{}])[-1].get("content", "")
+        return SQL if prompt.startswith("You write MySQL queries") else ANSWER
+
+    def chunk(self, body, text, done, prompt_ns=0, eval_ns=0, count=0):
+        chunk = {"model": body.get("model"), "done": done}
+        if "messages" in body:
+            chunk["message"] = {"role": "assistant", "content": text}
+        else:
+            chunk["response"] = text
+        if done:
+            chunk.update(prompt_eval_duration=prompt_ns, prompt_eval_count=len(json.dumps(body)) // 4,
+                         eval_duration=eval_ns, eval_count=count)
+        return chunk
+
+    def answer(self, handler, body):
+        words = [w + " " for w in self.text_for(body).split(" ")]
+        start = time.perf_counter()
+        time.sleep(self.prompt_latency)
+        prompt_ns = int((time.perf_counter() - start) * 1e9)
+        if not body.get("stream", True):
+            time.sleep(self.token_latency * len(words))
+            eval_ns = int((time.perf_counter() - start) * 1e9) - prompt_ns
+            data = json.dumps(self.chunk(body, "".join(words).strip(), True, prompt_ns, eval_ns, len(words))).encode()
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send(chunk):
+            line = json.dumps(chunk).encode() + b"\n"
+            handler.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            handler.wfile.flush()
+
+        for w in words:
+            time.sleep(self.token_latency)
+            send(self.chunk(body, w, False))
+        eval_ns = int((time.perf_counter() - start) * 1e9) - prompt_ns
+        send(self.chunk(body, "", True, prompt_ns, eval_ns, len(words)))
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
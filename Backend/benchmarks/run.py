@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import corpora
+import sqlite_mysql
+from fake_ollama import FakeOllama
+
+# End-to-end benchmark of main4.app against synthetic corpora, a fake Ollama
+# and a SQLite stand-in for MySQL. Requests go through the ASGI app
+# in-process, so the numbers cover the backend itself without network
+# overhead. Results are compared with baselines/<name>.json.
+
+BASELINE_DIR = os.path.join(HERE, "baselines")
+# metrics where a larger value is a regression; the rest regress when they drop
+LOWER_IS_BETTER = ("p50_ms", "p99_ms", "peak_rss_mb")
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def summarize(latencies, elapsed, errors):
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+# runs call(i) for i < n with at most `concurrency` in flight
+async def load(call, n, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with gate:
+            start = time.perf_counter()
+            r = await call(i)
+            if r.status_code != 200:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+async def ingest(client, path, collection):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        r = await client.post("/upload_csv", params={"collection": collection},
+                              files={"file": (os.path.basename(path), f, "text/csv")})
+    r.raise_for_status()
+    job_id = r.json()["job_id"]
+    while True:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            break
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - start
+    if job["status"] == "failed":
+        raise RuntimeError(f"Ingest of {path} failed: {job['error']}")
+    return {
+        "rows": job["rows_indexed"],
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(job["rows_indexed"] / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+async def browse(client, table, page_size, pages):
+    latencies = []
+    start = time.perf_counter()
+    cursor = None
+    for _ in range(pages):
+        t = time.perf_counter()
+        r = await client.get(f"/get_mysql_data/{table}",
+                             params={"limit": page_size, **({"after": cursor} if cursor else {})})
+        r.raise_for_status()
+        latencies.append(time.perf_counter() - t)
+        cursor = r.json()["next_cursor"]
+        if not cursor:
+            break
+    return summarize(latencies, time.perf_counter() - start, 0)
+
+async def run_size(args, size):
+    import httpx
+    import main4
+
+    rows = corpora.SIZES[size]
+    paths = {kind: corpora.generate(kind, rows, args.corpus_dir) for kind in corpora.KINDS}
+    for kind, path in paths.items():
+        sqlite_mysql.load_table(f"bench_{size}", kind, pd.read_csv(path))
+
+    results = {}
+    transport = httpx.ASGITransport(app=main4.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for kind, path in paths.items():
+            results[f"ingest/{kind}"] = await ingest(client, path, f"{kind}_{size}")
+
+        questions = ["What is the total balance of Partner C in BRI?",
+                     "How many customers does Unit K have on 2025-02-14?",
+                     "Show the weekly average for Retail and Partner B"]
+        results["POST /query"] = await load(
+            lambda i: client.post("/query", json={"query": f"{questions[i % 3]} #{i}"}),
+            args.requests, args.concurrency)
+        main4.AGGREGATE_ANSWERS = "direct"
+        aggregates = ["What is the total balance of Partner C in BRI?",
+                      "How many customers does Unit K have on 2025-02-14?",
+                      "Average no_of_customers per business_unit"]
+        results["POST /query aggregate"] = await load(
+            lambda i: client.post("/query", json={"query": f"{aggregates[i % 3]} #{i}"}),
+            args.requests, args.concurrency)
+        main4.AGGREGATE_ANSWERS = "off"
+
+        r = await client.post("/update_mysql_credentials",
+                              json={"host": "sqlite", "user": "bench", "password": "", "database": f"bench_{size}"})
+        r.raise_for_status()
+        results["GET /get_mysql_data"] = await browse(client, "balance_data", args.page_size, args.pages)
+
+        first = (await client.get("/get_mysql_data/balance_data", params={"limit": 200})).json()["rows"]
+        results["POST /query_mysql_ai rows"] = await load(
+            lambda i: client.post("/query_mysql_ai", json={
+                "query": f"Make a chart of total balance by business unit #{i}",
+                "selectedRows": first, "table": "balance_data"}),
+            args.requests, args.concurrency)
+        results["POST /query_mysql_ai sql"] = await load(
+            lambda i: client.post("/query_mysql_ai", json={
+                "query": f"Total balance per business unit #{i}", "mode": "sql"}),
+            args.requests, args.concurrency)
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(key, {}).get(metric)
+            if not old or metric in ("requests", "errors", "rows", "seconds"):
+                continue
+            change = (value - old) / old
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                regressions.append(f"{key} {metric}: {old} -> {value} ({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot backend")
+    parser.add_argument("--size", choices=list(corpora.SIZES), default="10k")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--token-latency", type=float, default=0.005, help="seconds per generated token")
+    parser.add_argument("--prompt-latency", type=float, default=0.02, help="seconds before the first token")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "chatbot-bench-corpora"))
+    parser.add_argument("--baseline", help="baseline name, defaults to the corpus size")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before flagging")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    args.corpus_dir = os.path.abspath(args.corpus_dir)
+    fake = FakeOllama(args.token_latency, args.prompt_latency).start()
+    os.environ["OLLAMA_URL"] = fake.url
+    # /query is measured through retrieval and the LLM; questions the
+    # aggregate tables answer are measured separately
+    os.environ["AGGREGATE_ANSWERS"] = "off"
+    workdir = tempfile.mkdtemp(prefix="chatbot-bench-")
+    os.chdir(workdir)
+
+    import mysql.connector
+    sqlite_mysql.folder = workdir
+    mysql.connector.connect = sqlite_mysql.connect
+
+    try:
+        results = asyncio.run(run_size(args, args.size))
+    finally:
+        fake.stop()
+    report = {"size": args.size, "requests": args.requests, "concurrency": args.concurrency,
+              "token_latency": args.token_latency, "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    path = os.path.join(BASELINE_DIR, f"{args.baseline or args.size}.json")
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {path}")
+        return
+    if not os.path.exists(path):
+        print(f"No baseline at {path}; run with --save-baseline to create one")
+        return
+    with open(path, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
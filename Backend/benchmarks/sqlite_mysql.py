@@ -0,0 +1,126 @@
+import os
+import re
+import sqlite3
+import mysql.connector
+
+# Stand-in for the part of mysql.connector the backend uses, backed by SQLite
+# files (<folder>/<database>.sqlite). SQLite already accepts backtick quoting,
+# row-value comparisons and LIMIT/OFFSET; the INFORMATION_SCHEMA and SHOW
+# queries the backend issues are answered from sqlite_master and PRAGMAs.
+folder = "."
+
+TYPES = {"INTEGER": "int", "REAL": "double", "TEXT": "varchar", "NUMERIC": "decimal", "BLOB": "blob"}
+
+def connect(database=None, use_pure=None, **config):
+    return Connection(os.path.join(folder, f"{database}.sqlite"))
+
+def load_table(database, table, df):
+    db = sqlite3.connect(os.path.join(folder, f"{database}.sqlite"))
+    columns = ", ".join(
+        f'"{c}" {"INTEGER" if df[c].dtype.kind in "bi" else "REAL" if df[c].dtype.kind == "f" else "TEXT"}'
+        for c in df.columns)
+    db.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY, {columns})')
+    df.to_sql(table, db, if_exists="append", index=False)
+    db.commit()
+    db.close()
+
+class Connection:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.unread_result = False
+
+    def cursor(self, dictionary=False, buffered=None):
+        return Cursor(self, dictionary)
+
+    def get_server_info(self):
+        return "8.0.0-sqlite"
+
+    def ping(self, reconnect=False):
+        self.db.execute("SELECT 1")
+
+    def consume_results(self):
+        self.unread_result = False
+
+    @property
+    def in_transaction(self):
+        return self.db.in_transaction
+
+    def start_transaction(self, readonly=False):
+        self.db.execute("BEGIN")
+
+    def rollback(self):
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+
+    def commit(self):
+        if self.db.in_transaction:
+            self.db.execute("COMMIT")
+
+    def close(self):
+        self.db.close()
+
+class Cursor:
+    def __init__(self, conn, dictionary):
+        self.conn = conn
+        self.dictionary = dictionary
+        self.rows = iter(())
+        self.description = None
+
+    def result(self, columns, rows):
+        self.description = [(c,) for c in columns]
+        self.rows = iter(rows)
+
+    def tables(self):
+        return [r[0] for r in self.conn.db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+
+    def execute(self, sql, params=()):
+        try:
+            self.run(sql, tuple(params or ()))
+        except sqlite3.Error as e:
+            raise mysql.connector.Error(msg=str(e))
+
+    def run(self, sql, params):
+        upper = sql.upper()
+        if upper.startswith("SET "):
+            self.result([], [])
+        elif upper.startswith("SHOW TABLES"):
+            self.result(["Tables"], [(t,) for t in self.tables()])
+        elif "INFORMATION_SCHEMA.TABLES" in upper:
+            rows = [(t, self.conn.db.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0], None, None)
+                    for t in self.tables()]
+            self.result(["TABLE_NAME", "TABLE_ROWS", "UPDATE_TIME", "CREATE_TIME"], rows)
+        elif "INFORMATION_SCHEMA.COLUMNS" in upper:
+            names = params if "TABLE_NAME IN" in upper else self.tables()
+            rows = []
+            for t in names:
+                for _, name, kind, notnull, _, pk in self.conn.db.execute(f'PRAGMA table_info("{t}")'):
+                    data_type = TYPES.get(kind.upper(), "varchar")
+                    rows.append((t, name, data_type, data_type, "NO" if notnull or pk else "YES", "PRI" if pk else ""))
+            self.result(["TABLE_NAME", "COLUMN_NAME", "DATA_TYPE", "COLUMN_TYPE", "IS_NULLABLE", "COLUMN_KEY"], rows)
+        else:
+            cur = self.conn.db.execute(re.sub(r"%s", "?", sql), params)
+            self.description = cur.description
+            self.rows = cur
+
+    def shape(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip((d[0] for d in self.description), row))
+
+    def fetchone(self):
+        return self.shape(next(self.rows, None))
+
+    def fetchmany(self, size=1):
+        out = []
+        for row in self.rows:
+            out.append(self.shape(row))
+            if len(out) >= size:
+                break
+        return out
+
+    def fetchall(self):
+        return [self.shape(r) for r in self.rows]
+
+    def close(self):
+        self.rows = iter(())
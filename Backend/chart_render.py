@@ -0,0 +1,118 @@
+import os
+import re
+import io
+import json
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", os.path.join("index_store", "charts"))
+CHART_CACHE_MAX_FILES = int(os.getenv("CHART_CACHE_MAX_FILES", "1000"))
+
+KEY = re.compile(r"^[0-9a-f]{40}$")
+DEFAULT_OPTIONS = {"width": 6, "height": 4, "dpi": 100, "color": "skyblue"}
+
+# Runs in a worker process. Uses the Figure API on the Agg canvas, so no
+# pyplot global state is involved.
+def draw(chart_data, options):
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    labels = chart_data["labels"]
+    values = np.array(chart_data["datasets"][0]["data"], dtype=float)
+    y_label = chart_data["datasets"][0]["label"]
+    fig = Figure(figsize=(options["width"], options["height"]), dpi=options["dpi"])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.bar(labels, np.nan_to_num(values), color=options["color"])
+    ax.set_xlabel("Category")
+    ax.set_ylabel(y_label)
+    ax.set_title(f"{y_label} by Category")
+    ax.tick_params(axis="x", labelrotation=45)
+    min_val = float(np.nanmin(values))
+    max_val = float(np.nanmax(values))
+    margin = (max_val - min_val) * 0.05 or 1
+    ax.set_ylim(min_val - margin, max_val + margin)
+    tick_interval = max((max_val - min_val) / 5, 1)
+    ax.set_yticks([round(min_val + i * tick_interval, 2) for i in range(6)])
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+def chart_key(chart_data, options):
+    raw = json.dumps({"data": chart_data, "options": options}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+# Renders charts to PNG in a process pool and keeps them on disk under a hash
+# of the chart data and options, so an identical chart is rendered once and
+# served by URL rather than inlined as base64.
+class ChartRenderer:
+    def __init__(self, folder=CHART_CACHE_DIR, workers=CHART_RENDER_WORKERS, max_files=CHART_CACHE_MAX_FILES):
+        self.folder = folder
+        self.max_files = max_files
+        os.makedirs(folder, exist_ok=True)
+        # spawn: forking a process that already holds model and server threads is unsafe
+        self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.rendered = 0
+        self.hits = 0
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}.png")
+
+    def read(self, key):
+        if not KEY.match(key):
+            return None
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def render(self, chart_data, options=None):
+        options = {**DEFAULT_OPTIONS, **(options or {})}
+        key = chart_key(chart_data, options)
+        if os.path.exists(self.path(key)):
+            self.hits += 1
+            return key
+        with self.lock:
+            fut = self.pending.get(key)
+            owner = fut is None
+            if owner:
+                fut = self.pool.submit(draw, chart_data, options)
+                self.pending[key] = fut
+        try:
+            png = fut.result()
+        finally:
+            if owner:
+                with self.lock:
+                    self.pending.pop(key, None)
+        if not os.path.exists(self.path(key)):
+            tmp = f"{self.path(key)}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(png)
+            os.replace(tmp, self.path(key))
+        if owner:
+            self.rendered += 1
+            if self.rendered % 50 == 0:
+                self.evict()
+        return key
+
+    def evict(self):
+        files = [os.path.join(self.folder, f) for f in os.listdir(self.folder) if f.endswith(".png")]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for f in files[:len(files) - self.max_files]:
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {"rendered": self.rendered, "cache_hits": self.hits, "pending": len(self.pending)}
@@ -0,0 +1,129 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# upper bound on points per dataset sent to the browser
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+COLUMN_SYNONYMS = {
+    "sales": "store_sales",
+    "income": "store_sales",
+    "revenue": "store_sales",
+    "customers": "no_of_customers",
+    "length": "length",
+    "balance": "total_balance",
+    "quantity": "quantity",
+    "amount": "total_balance",
+    "id": "id"
+}
+
+COLORS = [
+    "rgba(75, 192, 192, 0.6)",
+    "rgba(255, 99, 132, 0.6)",
+    "rgba(54, 162, 235, 0.6)",
+    "rgba(255, 206, 86, 0.6)",
+    "rgba(153, 102, 255, 0.6)",
+    "rgba(255, 159, 64, 0.6)",
+]
+
+AGGREGATES = [
+    (r"\b(average|avg|mean)\b", "mean"),
+    (r"\b(count|number of|how many)\b", "count"),
+    (r"\b(max|maximum|highest|largest)\b", "max"),
+    (r"\b(min|minimum|lowest|smallest)\b", "min"),
+]
+
+def aggregate_of(query):
+    for pattern, func in AGGREGATES:
+        if re.search(pattern, query):
+            return func
+    return "sum"
+
+def column_kinds(df):
+    return {c: "number" if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])
+            else "text" for c in df.columns}
+
+def value_columns(numeric_columns, query):
+    words = query.split()
+    picked = [COLUMN_SYNONYMS[w] for w in words if COLUMN_SYNONYMS.get(w) in numeric_columns]
+    picked += [c for c in numeric_columns if c.lower() in query and c not in picked]
+    if picked:
+        return list(dict.fromkeys(picked))
+    return [next((c for c in numeric_columns if c != "id"), numeric_columns[0])]
+
+# Largest-Triangle-Three-Buckets: keeps the first and last point and, from each
+# of n - 2 equal buckets, the point forming the largest triangle with the point
+# kept before it and the mean of the next bucket.
+def lttb(x, y, n):
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    keep = np.empty(n, dtype=int)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (size - 1, size)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+# keeps the n - 1 largest groups and folds the rest into "Other"
+def top_groups(frame, n, func):
+    order = frame.iloc[:, 0].abs().sort_values(ascending=False).index
+    head, rest = frame.loc[order[:n - 1]], frame.loc[order[n - 1:]]
+    other = rest.agg("sum" if func in ("sum", "count") else func).to_frame("Other").T
+    return pd.concat([head, other])
+
+def gen_chart_data(rows, user_query="", kinds=None, max_points=CHART_MAX_POINTS):
+    if not rows:
+        return None
+    df = pd.DataFrame(rows)
+    kinds = {c: k for c, k in (kinds or column_kinds(df)).items() if c in df.columns}
+    numeric_columns = [c for c, k in kinds.items() if k == "number"]
+    if not numeric_columns:
+        return None
+    query = user_query.lower()
+    ys = value_columns(numeric_columns, query)
+    values = df[ys].apply(pd.to_numeric, errors="coerce")
+    # a row is charted only if it has at least one value, so labels stay aligned
+    present = values.notna().any(axis=1).to_numpy()
+    values = values[present]
+    if values.empty:
+        return None
+
+    x_col = next((c for c in kinds if c not in numeric_columns), None)
+    if x_col is None:
+        labels = pd.Series([f"Row {i + 1}" for i in np.flatnonzero(present)], index=values.index)
+    else:
+        labels = df.loc[present, x_col].astype(str)
+
+    names = ys
+    if labels.duplicated().any():
+        func = aggregate_of(query)
+        values = values.groupby(labels.to_numpy(), sort=False).agg(func)
+        names = [f"{c} ({func})" for c in ys]
+        if len(values) > max_points:
+            values = top_groups(values, max_points, func)
+        labels = values.index.astype(str)
+    elif len(values) > max_points:
+        y = np.nan_to_num(values.iloc[:, 0].to_numpy(dtype=float))
+        keep = lttb(np.arange(len(y), dtype=float), y, max_points)
+        values, labels = values.iloc[keep], labels.iloc[keep]
+
+    data = values.to_numpy(dtype=float).round(6)
+    return {
+        "labels": list(labels),
+        "datasets": [
+            {
+                "label": name,
+                "data": [None if np.isnan(v) else float(v) for v in data[:, i]],
+                "backgroundColor": COLORS[i % len(COLORS)]
+            }
+            for i, name in enumerate(names)
+        ]
+    }
@@ -0,0 +1,108 @@
+import os
+import re
+import math
+import pandas as pd
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# selections larger than this also get per-column statistics
+CONTEXT_SUMMARY_MIN_ROWS = int(os.getenv("CONTEXT_SUMMARY_MIN_ROWS", "20"))
+MAX_GROUPS = 20
+
+TOKEN = re.compile(r"\d|[^\W\d_]+|[^\w\s]|_")
+
+# Rough count for Mistral's tokenizer: digits and punctuation are a token each,
+# words about one token per four letters.
+def estimate_tokens(text):
+    return sum(math.ceil(len(t) / 4) if t[0].isalpha() else 1 for t in TOKEN.findall(text))
+
+def cell(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return ""
+    if isinstance(v, float):
+        if v.is_integer() and abs(v) < 1e15:
+            return str(int(v))
+        return f"{v:.2f}" if abs(v) >= 1 else f"{v:.4g}"
+    return str(v)
+
+def mentioned(columns, question):
+    q = question.lower().replace("_", " ")
+    return [c for c in columns if str(c).lower().replace("_", " ") in q]
+
+def numeric(df, kinds):
+    if kinds:
+        return [c for c in df.columns if kinds.get(c) == "number"]
+    return [c for c in df.columns
+            if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+
+def summary(df, numbers, focus):
+    lines = []
+    values = df[numbers].apply(pd.to_numeric, errors="coerce") if numbers else None
+    if numbers:
+        stats = values.agg(["count", "sum", "mean", "min", "max"])
+        for c in numbers:
+            s = stats[c]
+            lines.append(f"{c}: count {int(s['count'])}, sum {cell(s['sum'])}, mean {cell(s['mean'])}, "
+                         f"min {cell(s['min'])}, max {cell(s['max'])}")
+    groups = None
+    for c in df.columns:
+        if c in numbers:
+            continue
+        counts = df[c].astype(str).value_counts()
+        if counts.iloc[0] > 1:
+            top = ", ".join(f"{k} ({v})" for k, v in counts.head(5).items())
+            lines.append(f"{c}: {len(counts)} distinct, most common {top}")
+        else:
+            lines.append(f"{c}: {len(counts)} distinct")
+        if groups is None and len(counts) <= MAX_GROUPS and (not focus or c in focus):
+            groups = c
+    targets = [c for c in numbers if c in focus] or numbers[:1]
+    if groups is not None and targets:
+        sums = values[targets].groupby(df[groups].astype(str)).sum()
+        for t in targets:
+            lines.append(f"sum of {t} by {groups}: " + ", ".join(f"{k} {cell(v)}" for k, v in sums[t].items()))
+    return lines
+
+# Renders rows for a prompt within a token budget: constant columns are stated
+# once, large selections are summarized with pandas, and the remaining budget
+# is filled with a single-header table, narrowed to the columns the question
+# names when the full table would not fit.
+def build(rows, question, kinds=None, budget=CONTEXT_TOKEN_BUDGET, total=None):
+    if not rows:
+        return "No data selected."
+    total = total or len(rows)
+    df = pd.DataFrame(rows)
+    lines = []
+    if len(df) > 1:
+        unique = df.astype(str).nunique()
+        constant = [c for c in df.columns if unique[c] <= 1]
+        if constant and len(constant) < len(df.columns):
+            lines.append("Same in every row: " + ", ".join(f"{c} = {cell(df[c].iloc[0])}" for c in constant))
+            df = df.drop(columns=constant)
+
+    numbers = numeric(df, kinds)
+    focus = mentioned(df.columns, question)
+    if len(df) > CONTEXT_SUMMARY_MIN_ROWS:
+        lines += summary(df, numbers, focus)
+    used = sum(estimate_tokens(line) for line in lines)
+
+    columns = focus + [c for c in df.columns if c not in focus]
+    sample = [" | ".join(cell(v) for v in r) for r in df[columns].head(5).itertuples(index=False)]
+    per_row = max(estimate_tokens("\n".join(sample)) / len(sample), 1)
+    if focus and used + per_row * len(df) > budget:
+        label = next((c for c in columns if c not in numbers and c not in focus), None)
+        columns = focus + ([label] if label else [])
+
+    header = " | ".join(str(c) for c in columns)
+    used += estimate_tokens(header)
+    table = [header]
+    for r in df[columns].itertuples(index=False):
+        line = " | ".join(cell(v) for v in r)
+        cost = estimate_tokens(line)
+        if used + cost > budget and len(table) > 1:
+            break
+        table.append(line)
+        used += cost
+    shown = len(table) - 1
+    if shown < total:
+        table.append(f"(showing {shown} of {total} rows)")
+    return "\n".join(lines + table)
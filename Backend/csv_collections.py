@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+from collections import OrderedDict
+from csv_store import CSVStore
+from aggregate_router import aliases, normalize, phrase_pattern
+
+COLLECTIONS_MAX_LOADED = int(os.getenv("COLLECTIONS_MAX_LOADED", "4"))
+DEFAULT_COLLECTION = "default"
+NAME = re.compile(r"^[a-z0-9_-]{1,64}$")
+
+def collection_name(filename):
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    return re.sub(r"[^a-z0-9_-]+", "_", stem).strip("_")[:64] or DEFAULT_COLLECTION
+
+# column names (or their aliases) the question uses count twice, values of
+# the collection's low-cardinality columns ("Unit K", "Partner C") once
+def score(meta, query):
+    text = normalize(query)
+    columns = sum(2 for c in meta["columns"] if any(phrase_pattern(a).search(text) for a in aliases(c)))
+    values = sum(1 for v in meta.get("values", []) if v.lower() in text and phrase_pattern(v.lower()).search(text))
+    return columns + values
+
+# Named CSV datasets, each with its own segment store (index, rows, attribute
+# indexes) under <folder>/collections/<name>. "default" is the store at the
+# top of <folder> that predates collections. At most max_loaded stores stay
+# open; the least recently used idle one is closed when another is opened.
+# Column lists are kept in collections.json so a question can be routed to a
+# collection without opening every store.
+class CollectionManager:
+    def __init__(self, folder, dimension, legacy_index=None, legacy_metadata=None,
+                 max_loaded=COLLECTIONS_MAX_LOADED):
+        self.folder = folder
+        self.root = os.path.join(folder, "collections")
+        self.catalog_path = os.path.join(folder, "collections.json")
+        self.dimension = dimension
+        self.legacy = (legacy_index, legacy_metadata)
+        self.max_loaded = max_loaded
+        self.loaded = OrderedDict()
+        self.lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+        self.catalog = self.read_catalog()
+
+    def read_catalog(self):
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path, "r") as f:
+                return json.load(f)
+        catalog = {}
+        if os.path.exists(os.path.join(self.folder, "segments.json")) or all(
+                p and os.path.exists(p) for p in self.legacy):
+            catalog[DEFAULT_COLLECTION] = {"columns": [], "rows": None, "updated_at": 0}
+        return catalog
+
+    def write_catalog(self):
+        tmp = self.catalog_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.catalog, f)
+        os.replace(tmp, self.catalog_path)
+
+    def folder_of(self, name):
+        return self.folder if name == DEFAULT_COLLECTION else os.path.join(self.root, name)
+
+    def names(self):
+        return sorted(self.catalog)
+
+    def get(self, name, create=False):
+        if not NAME.match(name):
+            raise ValueError(f"Invalid collection name {name}")
+        with self.lock:
+            store = self.loaded.get(name)
+            if store is not None:
+                self.loaded.move_to_end(name)
+                return store
+            if name not in self.catalog:
+                if not create:
+                    return None
+                self.catalog[name] = {"columns": [], "values": [], "rows": 0, "updated_at": time.time()}
+                self.write_catalog()
+            if name == DEFAULT_COLLECTION:
+                store = CSVStore(self.folder, self.dimension, *self.legacy)
+            else:
+                store = CSVStore(self.folder_of(name), self.dimension)
+            store.load()
+            self.loaded[name] = store
+            self.evict()
+            if self.catalog[name]["rows"] is None or "values" not in self.catalog[name]:
+                self.refresh(name)
+            return store
+
+    # opens (or creates) a collection together with a segment writer for an
+    # upload; the writer keeps the store busy, so it is not closed while the
+    # upload waits for the ingest worker
+    def open_writer(self, name):
+        with self.lock:
+            store = self.get(name, create=True)
+            return store, store.open_segment()
+
+    def evict(self):
+        # the store opened last is the one being asked for
+        for name in list(self.loaded)[:-1]:
+            if len(self.loaded) <= self.max_loaded:
+                break
+            if not self.loaded[name].busy():
+                del self.loaded[name]
+
+    # records the columns and size of a collection after an upload
+    def refresh(self, name, store=None):
+        with self.lock:
+            store = store or self.loaded.get(name)
+            if store is None or name not in self.catalog:
+                return
+            dims, _ = store.dimensions()
+            values = sorted({v for spec in dims.values() if not spec["date"] for v in spec["values"]} - {"True", "False"})
+            self.catalog[name] = {"columns": list(store.columns()), "values": values, "rows": len(store),
+                                  "updated_at": time.time()}
+            self.write_catalog()
+
+    def drop(self, name):
+        with self.lock:
+            if name not in self.catalog:
+                return False
+            store = self.loaded.get(name)
+            if store is not None and store.busy():
+                raise RuntimeError(f"Collection {name} is being written")
+            self.loaded.pop(name, None)
+            del self.catalog[name]
+            self.write_catalog()
+            if name == DEFAULT_COLLECTION:
+                for folder in ("segments", "snapshots"):
+                    shutil.rmtree(os.path.join(self.folder, folder), ignore_errors=True)
+                for path in (os.path.join(self.folder, "segments.json"), *self.legacy):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+            else:
+                shutil.rmtree(self.folder_of(name), ignore_errors=True)
+            return True
+
+    def info(self):
+        with self.lock:
+            catalog, loaded = dict(self.catalog), set(self.loaded)
+        return [{"name": name, **{k: v for k, v in meta.items() if k != "values"}, "loaded": name in loaded}
+                for name, meta in sorted(catalog.items())]
+
+    def snapshot_stats(self):
+        with self.lock:
+            return {name: store.snapshots.stats() for name, store in self.loaded.items()}
+
+    # the collection whose columns and values the question names most; when
+    # none or several score best, distance(store) (how far the store's nearest
+    # row is from the question) decides among the tied stores that are already
+    # open, and the most recent upload otherwise. Stores are never opened
+    # here, so a vague question does not load every collection. Entries are
+    # replaced, never changed in place, so a shallow copy is a consistent view.
+    def route(self, query, distance=None):
+        with self.lock:
+            catalog, loaded = dict(self.catalog), dict(self.loaded)
+        if not catalog:
+            return None
+        scores = {n: score(meta, query) for n, meta in catalog.items()}
+        best = max(scores.values())
+        tied = [n for n in sorted(scores) if scores[n] == best]
+        open_tied = [n for n in tied if n in loaded]
+        if len(tied) > 1 and open_tied and distance is not None:
+            return min(open_tied, key=lambda n: distance(loaded[n]))
+        return max(tied, key=lambda n: catalog[n]["updated_at"])
@@ -0,0 +1,413 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+import faiss
+from row_store import RowStore, RowStoreWriter, write_rows
+import attr_index
+import lexical_index
+import aggregate_cube
+import snapshot
+from lexical_index import HYBRID_SEARCH
+from snapshot import SnapshotManager, SnapshotError
+from vector_index import IndexBuilder, all_vectors, read_index, search as search_index
+from metrics import record, span
+
+MAX_SEGMENTS = int(os.getenv("MAX_SEGMENTS", "4"))
+SEGMENT_NAME = re.compile(r"^seg_(\d+)$")
+LOAD_ERRORS = (SnapshotError, OSError, ValueError, KeyError, RuntimeError)
+
+def load_hashes(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0, dtype="uint64")
+    return np.memmap(path, dtype="uint64", mode="r")
+
+def sorted_contains(sorted_hashes, hashes):
+    if not len(sorted_hashes):
+        return np.zeros(len(hashes), dtype=bool)
+    pos = np.searchsorted(sorted_hashes, hashes)
+    return sorted_hashes[np.minimum(pos, len(sorted_hashes) - 1)] == hashes
+
+class Segment:
+    def __init__(self, name, index, rows, hashes, attrs, lexical, cubes, files=None):
+        self.name = name
+        self.index = index
+        self.rows = rows
+        # sorted content hashes of the rows, used to skip re-uploaded rows
+        self.hashes = hashes
+        self.attrs = attrs
+        self.lexical = lexical
+        self.cubes = cubes
+        # size and checksum of each file, as recorded in the snapshots
+        self.files = files
+
+    def __len__(self):
+        return len(self.rows)
+
+# append-only store: every upload becomes its own index shard and metadata
+# segment, and shards are compacted in the background
+class CSVStore:
+    def __init__(self, folder, dimension, legacy_index=None, legacy_metadata=None):
+        self.folder = os.path.join(folder, "segments")
+        self.manifest_path = os.path.join(folder, "segments.json")
+        self.legacy = (legacy_index, legacy_metadata)
+        self.dimension = dimension
+        self.segments = []
+        self.next_id = 1
+        self.lock = threading.RLock()
+        self.merging = False
+        # segment writers opened for uploads and not yet committed or aborted
+        self.writers = 0
+        # names of segments being written, whose files are not in any snapshot yet
+        self.pending = set()
+        self.snapshots = SnapshotManager(folder, self.manifest_path)
+        self.column_names, self.columns_of = (), None
+        self.dimension_spec, self.dimensions_of = ({}, []), None
+        os.makedirs(self.folder, exist_ok=True)
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments)
+
+    def paths(self, name):
+        base = os.path.join(self.folder, name)
+        return base + ".faiss", base + ".rows", base + ".hashes", base + ".attrs", base + ".bm25", base + ".cubes.json"
+
+    # opens the newest snapshot whose files and row counts check out, rolling
+    # back past any that do not
+    def load(self):
+        start = time.perf_counter()
+        if not os.path.exists(self.manifest_path) and not self.snapshots.versions():
+            self.import_legacy()
+        manifest, segments, failed = None, [], False
+        for candidate in self.snapshots.candidates():
+            try:
+                segments = self.open_snapshot(candidate)
+            except LOAD_ERRORS as e:
+                print(f"Snapshot {candidate.get('version', 0)} of {self.folder} is unusable ({e})")
+                failed = True
+                continue
+            manifest = candidate
+            break
+        if manifest is None:
+            if failed:
+                print(f"No usable snapshot of {self.folder}; starting empty")
+            return
+        ids = [int(m.group(1)) for m in map(SEGMENT_NAME.match, (n.split(".")[0] for n in os.listdir(self.folder))) if m]
+        with self.lock:
+            self.segments = segments
+            # ids of segments from discarded snapshots or interrupted uploads are not reused
+            self.next_id = max([manifest["next_id"]] + [i + 1 for i in ids])
+            if "version" not in manifest:
+                self.write_manifest()
+            elif failed:
+                print(f"Rolled {self.folder} back to snapshot {manifest['version']}")
+                self.snapshots.roll_back(manifest)
+            else:
+                self.snapshots.version = manifest["version"]
+            self.collect()
+        self.snapshots.loaded_seconds = time.perf_counter() - start
+
+    def open_snapshot(self, manifest):
+        segments = []
+        for entry in manifest["segments"]:
+            # manifests from before snapshots list bare names
+            entry = entry if isinstance(entry, dict) else {"name": entry}
+            if "files" in entry:
+                snapshot.verify_files(self.folder, entry["files"])
+            segment = self.open_files(entry["name"])
+            segment.files = entry.get("files")
+            counts = {"index": segment.index.ntotal, "rows": len(segment.rows),
+                      "bm25": segment.lexical.rows, "cubes": segment.cubes.rows}
+            if "rows" in entry:
+                counts["manifest"] = entry["rows"]
+            if len(set(counts.values())) > 1:
+                raise SnapshotError(f"{entry['name']} row counts disagree: {counts}")
+            segments.append(segment)
+        return segments
+
+    def open_files(self, name):
+        index_path, rows_path, hashes_path, attrs_path, lexical_path, cubes_path = self.paths(name)
+        if not os.path.exists(rows_path):
+            self.convert_json_rows(name)
+        rows = RowStore(rows_path)
+        if os.path.exists(os.path.join(attrs_path, attr_index.SPEC_FILE)):
+            attrs = attr_index.AttributeIndex(rows, attrs_path)
+        else:
+            attrs = attr_index.build(rows, attrs_path)
+        if os.path.exists(os.path.join(lexical_path, lexical_index.SPEC_FILE)):
+            lexical = lexical_index.LexicalIndex(lexical_path)
+        else:
+            lexical = lexical_index.build(rows, lexical_path)
+        if os.path.exists(cubes_path):
+            cubes = aggregate_cube.Cubes(cubes_path)
+        else:
+            cubes = aggregate_cube.build(rows, cubes_path)
+        return Segment(name, read_index(index_path), rows, load_hashes(hashes_path), attrs, lexical, cubes)
+
+    def import_legacy(self):
+        index_path, metadata_path = self.legacy
+        if not (index_path and os.path.exists(index_path) and os.path.exists(metadata_path)):
+            return
+        name = self.new_name()
+        seg_index = self.paths(name)[0]
+        os.replace(index_path, seg_index)
+        os.replace(metadata_path, os.path.join(self.folder, name + ".json"))
+        snapshot.write_json(self.manifest_path, {"segments": [name], "next_id": self.next_id})
+
+    # segments written before the columnar row store kept their rows as json
+    def convert_json_rows(self, name):
+        json_path = os.path.join(self.folder, name + ".json")
+        with open(json_path, "r") as f:
+            rows = json.load(f)
+        write_rows(self.paths(name)[1], pd.DataFrame(rows))
+        os.remove(json_path)
+
+    def new_name(self):
+        name = f"seg_{self.next_id:06d}"
+        self.next_id += 1
+        return name
+
+    # records self.segments as a new snapshot; call with the lock held
+    def write_manifest(self):
+        entries = []
+        for s in self.segments:
+            if s.files is None:
+                s.files = snapshot.describe(self.folder, self.paths(s.name))
+            entries.append({"name": s.name, "rows": len(s), "files": s.files})
+        self.snapshots.commit(entries, self.next_id)
+        self.collect()
+
+    # deletes the files of segments that no kept snapshot lists: merged-away
+    # segments once they age out, and uploads interrupted before publishing
+    def collect(self):
+        with self.lock:
+            keep = self.snapshots.referenced() | {s.name for s in self.segments} | self.pending
+            # listed under the lock: segments opened later get new names
+            unused = [e for e in os.listdir(self.folder)
+                      if SEGMENT_NAME.match(e.split(".")[0]) and e.split(".")[0] not in keep]
+        for entry in unused:
+            path = os.path.join(self.folder, entry)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                print(f"Could not remove {path} ({e})")
+
+    def open_segment(self):
+        with self.lock:
+            name = self.new_name()
+            self.pending.add(name)
+            self.writers += 1
+        return SegmentWriter(self, name, counted=True)
+
+    def busy(self):
+        return self.writers > 0 or self.merging
+
+    def publish(self, segment):
+        with self.lock:
+            self.segments = self.segments + [segment]
+            self.write_manifest()
+            should_merge = len(self.segments) > MAX_SEGMENTS and not self.merging
+            if should_merge:
+                self.merging = True
+        if should_merge:
+            threading.Thread(target=self.merge, daemon=True).start()
+
+    def remove_files(self, name):
+        index_path, rows_path, hashes_path, attrs_path, lexical_path, cubes_path = self.paths(name)
+        for path in (index_path, hashes_path, cubes_path):
+            if os.path.exists(path):
+                os.remove(path)
+        for path in (rows_path, attrs_path, lexical_path):
+            shutil.rmtree(path, ignore_errors=True)
+
+    # the column set only changes when segments are published or merged, and
+    # both replace self.segments, so it is recomputed only then
+    def columns(self):
+        segments = self.segments
+        if self.columns_of is not segments:
+            names = {}
+            for s in segments:
+                names.update((c["name"], None) for c in s.rows.columns)
+            self.column_names, self.columns_of = tuple(names), segments
+        return self.column_names
+
+    # dimension -> {"date": bool, "values": set} and measure names over all
+    # segments, for recognizing aggregate questions
+    def dimensions(self):
+        segments = self.segments
+        if self.dimensions_of is not segments:
+            dims, measures = {}, {}
+            for s in segments:
+                for name, spec in s.cubes.dims.items():
+                    entry = dims.setdefault(name, {"date": spec["date"], "values": set()})
+                    entry["values"].update(spec["values"])
+                measures.update(dict.fromkeys(s.cubes.measures))
+            self.dimension_spec, self.dimensions_of = (dims, list(measures)), segments
+        return self.dimension_spec
+
+    # group_by: dimension names, filters: {dimension: [values]}; None when
+    # some segment has no precomputed table for these dimensions
+    def aggregate(self, group_by, filters):
+        return aggregate_cube.combine([s.cubes for s in self.segments], group_by, filters)
+
+    # distance from q_emb to the nearest row, inf when the store is empty
+    def nearest(self, q_emb):
+        best = np.inf
+        for s in self.segments:
+            if len(s):
+                dists, ids = search_index(s.index, q_emb, 1)
+                if ids[0][0] >= 0:
+                    best = min(best, float(dists[0][0]))
+        return best
+
+    def knows(self, column, value):
+        return any(s.attrs.knows(column, value) for s in self.segments)
+
+    def contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for s in self.segments:
+            found |= sorted_contains(s.hashes, hashes)
+        return found
+
+    def merge(self):
+        try:
+            with self.lock:
+                old = list(self.segments)
+                name = self.new_name()
+                self.pending.add(name)
+            writer = SegmentWriter(self, name)
+            try:
+                for s in old:
+                    writer.add(all_vectors(s.index), s.rows.frame(), s.hashes)
+                merged = writer.finish()
+                with self.lock:
+                    # segments appended while merging stay after the merged one,
+                    # so global row ids do not move; the old segments' files
+                    # stay until the snapshots listing them are pruned
+                    self.segments = [merged] + self.segments[len(old):]
+                    self.write_manifest()
+            finally:
+                writer.release()
+        finally:
+            self.merging = False
+
+    # vector and BM25 rankings fused with reciprocal rank fusion; returns
+    # (fused scores, ids), best first. Each segment contributes its top k of
+    # both, restricted to the rows matching the filters, a list of (column,
+    # op, value) resolved on the attribute indexes.
+    def hybrid_search(self, q_emb, query, k, filters=None):
+        tokens = lexical_index.query_tokens(query) if HYBRID_SEARCH else []
+        segments = self.segments
+        vec_dists, vec_ids, lex_scores, lex_ids = [], [], [], []
+        spent = dict.fromkeys(["vector_search"] + ["filter"] * bool(filters) + ["keyword_search"] * bool(tokens), 0.0)
+        offset = 0
+        for s in segments:
+            candidates = None
+            if filters:
+                t = time.perf_counter()
+                candidates = s.attrs.candidates(filters)
+                spent["filter"] += time.perf_counter() - t
+            if candidates is not None and not len(candidates):
+                offset += len(s)
+                continue
+            t = time.perf_counter()
+            dists, ids = search_index(s.index, q_emb, k, candidates)
+            keep = ids[0] >= 0
+            vec_dists.append(dists[0][keep])
+            vec_ids.append(ids[0][keep] + offset)
+            spent["vector_search"] += time.perf_counter() - t
+            if tokens:
+                t = time.perf_counter()
+                scores, ids = s.lexical.search(tokens, k, candidates)
+                lex_scores.append(scores)
+                lex_ids.append(ids + offset)
+                spent["keyword_search"] += time.perf_counter() - t
+            offset += len(s)
+        for stage, seconds in spent.items():
+            record(stage, seconds)
+        with span("fuse"):
+            rankings = []
+            if vec_ids:
+                dists, ids = np.concatenate(vec_dists), np.concatenate(vec_ids)
+                rankings.append(ids[np.argsort(dists, kind="stable")[:k]])
+            if lex_ids:
+                scores, ids = np.concatenate(lex_scores), np.concatenate(lex_ids)
+                rankings.append(ids[np.argsort(-scores, kind="stable")[:k]])
+            return lexical_index.rrf(rankings, k)
+
+    def row(self, i):
+        for s in self.segments:
+            if i < len(s):
+                return s.rows.row(i)
+            i -= len(s)
+        raise IndexError(i)
+
+# writes one segment batch by batch: vectors go straight into the shard
+# index and rows into the columnar store, so memory does not grow with the
+# size of the upload
+class SegmentWriter:
+    def __init__(self, store, name, counted=False):
+        self.store = store
+        self.name = name
+        self.counted = counted
+        (self.index_path, self.rows_path, self.hashes_path, self.attrs_path, self.lexical_path,
+         self.cubes_path) = store.paths(name)
+        self.builder = IndexBuilder(store.dimension)
+        self.rows = RowStoreWriter(self.rows_path)
+        self.hashes = []
+
+    def add(self, vectors, df, hashes=None):
+        self.builder.add(vectors)
+        self.rows.append(df)
+        if hashes is not None and len(hashes):
+            self.hashes.append(np.sort(np.asarray(hashes, dtype="uint64")))
+
+    def contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for h in self.hashes:
+            found |= sorted_contains(h, hashes)
+        return found
+
+    def finish(self):
+        index = self.builder.finish()
+        faiss.write_index(index, self.index_path)
+        self.rows.close()
+        hashes = np.unique(np.concatenate(self.hashes)) if self.hashes else np.zeros(0, dtype="uint64")
+        hashes.tofile(self.hashes_path)
+        rows = RowStore(self.rows_path)
+        attrs = attr_index.build(rows, self.attrs_path)
+        lexical = lexical_index.build(rows, self.lexical_path)
+        cubes = aggregate_cube.build(rows, self.cubes_path)
+        files = snapshot.describe(self.store.folder, self.store.paths(self.name))
+        return Segment(self.name, index, rows, load_hashes(self.hashes_path), attrs, lexical, cubes, files)
+
+    def commit(self):
+        if not self.rows.rows:
+            self.abort()
+            return None
+        try:
+            segment = self.finish()
+            self.store.publish(segment)
+        finally:
+            self.release()
+        return segment
+
+    def abort(self):
+        self.rows.close()
+        self.store.remove_files(self.name)
+        self.release()
+
+    def release(self):
+        with self.store.lock:
+            self.store.pending.discard(self.name)
+        if self.counted:
+            self.counted = False
+            with self.store.lock:
+                self.store.writers -= 1
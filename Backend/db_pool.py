@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+from collections import deque
+import mysql.connector
+from metrics import histogram
+
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "8"))
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+MYSQL_POOL_IDLE_TIMEOUT = float(os.getenv("MYSQL_POOL_IDLE_TIMEOUT", "300"))
+# connections idle for longer than this are pinged before being handed out
+MYSQL_POOL_HEALTH_CHECK_AFTER = float(os.getenv("MYSQL_POOL_HEALTH_CHECK_AFTER", "30"))
+# the C extension decodes result sets much faster than the pure-Python protocol
+MYSQL_USE_PURE = os.getenv("MYSQL_USE_PURE", "0") == "1"
+
+pool_wait = histogram("mysql_pool_wait_seconds", "Time spent waiting for a pooled MySQL connection")
+
+class PoolTimeout(Exception):
+    pass
+
+# proxies a raw connection; close() hands it back to the pool instead
+class PooledConnection:
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.put(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ConnectionPool:
+    def __init__(self, config, size=MYSQL_POOL_SIZE, use_pure=MYSQL_USE_PURE):
+        self.config = dict(config)
+        self.size = size
+        self.use_pure = use_pure
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.created = 0
+        self.evicted = 0
+        self.failed_checks = 0
+        self.in_use = 0
+        threading.Thread(target=self.reap, daemon=True).start()
+
+    def connect(self):
+        conn = mysql.connector.connect(**self.config, use_pure=self.use_pure)
+        with self.lock:
+            self.created += 1
+        return conn
+
+    def healthy(self, conn, idle_for):
+        if idle_for < MYSQL_POOL_HEALTH_CHECK_AFTER:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            with self.lock:
+                self.failed_checks += 1
+            return False
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def get(self, timeout=MYSQL_POOL_TIMEOUT):
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=timeout):
+            pool_wait.observe(time.perf_counter() - start)
+            raise PoolTimeout("No MySQL connection available")
+        pool_wait.observe(time.perf_counter() - start)
+        try:
+            while True:
+                with self.lock:
+                    item = self.idle.pop() if self.idle else None
+                if item is None:
+                    conn = self.connect()
+                    break
+                conn, last_used = item
+                if self.healthy(conn, time.monotonic() - last_used):
+                    break
+                self.discard(conn)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.in_use += 1
+        return PooledConnection(self, conn)
+
+    def put(self, conn):
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+        except Exception:
+            self.discard(conn)
+            conn = None
+        with self.lock:
+            self.in_use -= 1
+            if conn is not None and not self.closed:
+                self.idle.append((conn, time.monotonic()))
+                conn = None
+        if conn is not None:
+            self.discard(conn)
+        self.slots.release()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self.lock:
+            stale = [item for item in self.idle if now - item[1] > MYSQL_POOL_IDLE_TIMEOUT]
+            for item in stale:
+                self.idle.remove(item)
+            self.evicted += len(stale)
+        for conn, _ in stale:
+            self.discard(conn)
+
+    def reap(self):
+        while not self.closed:
+            time.sleep(min(MYSQL_POOL_IDLE_TIMEOUT, 60))
+            self.evict_idle()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            idle, self.idle = list(self.idle), deque()
+        for conn, _ in idle:
+            self.discard(conn)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "idle": len(self.idle),
+            "created": self.created,
+            "evicted_idle": self.evicted,
+            "failed_health_checks": self.failed_checks,
+            "use_pure": self.use_pure,
+            "wait_seconds": pool_wait.snapshot(),
+        }
@@ -0,0 +1,85 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+EMBED_CACHE_MAX_ROWS = int(os.getenv("EMBED_CACHE_MAX_ROWS", "200000"))
+SQLITE_MAX_PARAMS = 500
+
+def text_digest(text):
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+def row_hashes(docs):
+    # first 8 bytes of the sha1 as uint64, small enough to keep per row
+    return np.frombuffer(b"".join(text_digest(d)[:8] for d in docs), dtype="<u8").astype("uint64")
+
+# persistent text -> embedding cache keyed by the sha1 of the row text,
+# evicting the least recently used rows once it grows past max_rows
+class EmbeddingCache:
+    def __init__(self, path, dimension, max_rows=EMBED_CACHE_MAX_ROWS):
+        self.dimension = dimension
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL, used INTEGER NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)")
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        now = time.time_ns()
+        with self.lock:
+            for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+                part = keys[start:start + SQLITE_MAX_PARAMS]
+                marks = ",".join("?" * len(part))
+                for key, vector in self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part):
+                    found[key] = np.frombuffer(vector, dtype="float32")
+            if found:
+                self.conn.executemany("UPDATE embeddings SET used = ? WHERE key = ?", [(now, k) for k in found])
+                self.conn.commit()
+        return found
+
+    def put_many(self, keys, vectors):
+        now = time.time_ns()
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, used) VALUES (?, ?, ?)",
+                [(k, v.tobytes(), now) for k, v in zip(keys, vectors)],
+            )
+            self.count += len(keys)
+            # evict in bulk once 10% over the limit instead of on every insert
+            if self.count > self.max_rows * 1.1:
+                self.conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY used LIMIT ?)",
+                    (max(self.count - self.max_rows, 0),),
+                )
+                self.count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self.conn.commit()
+
+    def encode(self, docs, encode):
+        keys = [text_digest(d) for d in docs]
+        found = self.get_many(set(keys))
+        missing = {}
+        for d, k in zip(docs, keys):
+            if k not in found and k not in missing:
+                missing[k] = d
+        self.hits += len(docs) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = encode(list(missing.values()))
+            self.put_many(list(missing), vectors)
+            found.update(zip(missing, np.asarray(vectors, dtype="float32")))
+        if not docs:
+            return np.zeros((0, self.dimension), dtype="float32")
+        return np.stack([found[k] for k in keys])
+
+    def stats(self):
+        return {"rows": self.count, "max_rows": self.max_rows, "hits": self.hits, "misses": self.misses}
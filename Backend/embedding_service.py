@@ -0,0 +1,101 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+EMBED_DIMENSION = int(os.getenv("EMBED_DIMENSION", "384"))
+# "torch" (default), "onnx", or "onnx-int8" for the dynamically quantized ONNX export
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_INT8_FILE = os.getenv("EMBED_ONNX_INT8_FILE", "onnx/model_qint8_avx2.onnx")
+EMBED_WARMUP = os.getenv("EMBED_WARMUP", "1") == "1"
+# concurrent query encodes arriving within this window share one forward pass
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+
+def load_model(name, backend):
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(name, device="cpu"), "torch"
+    kwargs = {"file_name": EMBED_ONNX_INT8_FILE} if backend == "onnx-int8" else {}
+    try:
+        return SentenceTransformer(name, device="cpu", backend="onnx", model_kwargs=kwargs), backend
+    except (ImportError, TypeError, ValueError, OSError) as e:
+        # older sentence-transformers or no onnxruntime/optimum installed
+        print(f"ONNX embedding backend unavailable ({e}); using torch")
+        return SentenceTransformer(name, device="cpu"), "torch"
+
+# Owns the sentence-transformer: loads it on first use (or in the background
+# via warmup), encodes document batches directly and coalesces single query
+# encodes from concurrent requests into micro-batches.
+class EmbeddingService:
+    def __init__(self, name=EMBED_MODEL, backend=EMBED_BACKEND, batch_size=64,
+                 window_ms=EMBED_BATCH_WINDOW_MS, max_batch=EMBED_MAX_BATCH):
+        self.name = name
+        self.requested_backend = backend
+        self.backend = None
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._model = None
+        self.load_lock = threading.Lock()
+        self.load_seconds = None
+        self.queries = queue.Queue()
+        self.batches = 0
+        self.batched_queries = 0
+        threading.Thread(target=self.batch_loop, daemon=True).start()
+
+    def model(self):
+        if self._model is None:
+            with self.load_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model, self.backend = load_model(self.name, self.requested_backend)
+                    self.load_seconds = time.perf_counter() - start
+        return self._model
+
+    def warmup(self):
+        threading.Thread(target=lambda: self.encode(["warmup"]), daemon=True).start()
+
+    def encode(self, docs, batch_size=None):
+        return np.asarray(self.model().encode(docs, batch_size=batch_size or self.batch_size,
+                                              normalize_embeddings=True), dtype="float32")
+
+    def encode_query(self, text):
+        fut = Future()
+        self.queries.put((text, fut))
+        return fut.result()
+
+    def batch_loop(self):
+        while True:
+            batch = [self.queries.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queries.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                vectors = self.encode([text for text, _ in batch], batch_size=len(batch))
+                for (_, fut), v in zip(batch, vectors):
+                    fut.set_result(v)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+            self.batches += 1
+            self.batched_queries += len(batch)
+
+    def stats(self):
+        return {
+            "model": self.name,
+            "backend": self.backend or self.requested_backend,
+            "loaded": self._model is not None,
+            "load_seconds": self.load_seconds,
+            "query_batches": self.batches,
+            "mean_query_batch": self.batched_queries / self.batches if self.batches else 0,
+        }
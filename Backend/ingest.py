@@ -0,0 +1,119 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from embedding_cache import row_hashes
+
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "256"))
+MAX_JOBS_KEPT = 100
+
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("INGEST_WORKERS", "1")))
+jobs = {}
+jobs_lock = threading.Lock()
+
+class IngestJob:
+    def __init__(self, filename, path, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.status = "queued"
+        self.rows = 0
+        self.duplicates = 0
+        self.bytes_read = 0
+        self.total_bytes = os.path.getsize(path)
+        self.created_at = time.time()
+        self.finished_at = None
+        self.error = None
+        # set when the rows were indexed but the follow-up (catalog, cache) failed
+        self.warning = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_indexed": self.rows,
+            "duplicates_skipped": self.duplicates,
+            "bytes_read": self.bytes_read,
+            "total_bytes": self.total_bytes,
+            "progress": round(self.bytes_read / self.total_bytes, 4) if self.total_bytes else 1.0,
+            "elapsed": round((self.finished_at or time.time()) - self.created_at, 3),
+            "error": self.error,
+            "warning": self.warning,
+        }
+
+def rows_to_text(df):
+    # same text as row_to_text, built column by column instead of row by row;
+    # map(str) keeps missing values as "nan"/"None" where astype(str) leaves NaN
+    text = None
+    for col in df.columns:
+        part = f"{col}: " + df[col].map(str)
+        text = part if text is None else text + ", " + part
+    return text.tolist() if text is not None else [""] * len(df)
+
+# writer: a segment writer opened on the store when the upload was accepted
+def run(job, store, writer, encode, on_done=None):
+    job.status = "running"
+    committed = False
+    try:
+        with open(job.path, "rb") as fh:
+            for chunk in pd.read_csv(fh, chunksize=CHUNK_ROWS):
+                docs = rows_to_text(chunk)
+                hashes = row_hashes(docs)
+                # rows already indexed, earlier in this file or in this chunk are skipped
+                keep = ~(pd.Series(hashes).duplicated().to_numpy() | store.contains(hashes) | writer.contains(hashes))
+                job.duplicates += int((~keep).sum())
+                chunk = chunk[keep].reset_index(drop=True)
+                docs = [d for d, k in zip(docs, keep) if k]
+                hashes = hashes[keep]
+                for start in range(0, len(chunk), EMBED_BATCH):
+                    end = start + EMBED_BATCH
+                    batch = chunk.iloc[start:end]
+                    writer.add(encode(docs[start:end]), batch, hashes[start:end])
+                    job.rows += len(batch)
+                job.bytes_read = fh.tell()
+        segment = writer.commit()
+        committed = True
+        job.bytes_read = job.total_bytes
+        job.status = "done"
+        if segment is not None and on_done:
+            on_done()
+    except Exception as e:
+        # a published segment is being served and must not be removed
+        if committed:
+            job.warning = f"Rows were indexed, but updating the collection failed: {e}"
+        else:
+            writer.abort()
+            job.status = "failed"
+            job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        # the upload's rows now live in the store (or the job failed); the
+        # copy saved by upload_path is not needed either way
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+# each upload gets its own file, so a second upload with the same name
+# cannot overwrite one that is still queued or being read
+def upload_path(folder, filename):
+    job_id = uuid.uuid4().hex
+    return job_id, os.path.join(folder, f"{job_id}_{os.path.basename(filename)}")
+
+def submit(filename, path, store, writer, encode, on_done=None, job_id=None):
+    job = IngestJob(filename, path, job_id)
+    with jobs_lock:
+        jobs[job.id] = job
+        if len(jobs) > MAX_JOBS_KEPT:
+            finished = [j for j in jobs.values() if j.finished_at]
+            for old in sorted(finished, key=lambda j: j.finished_at)[:len(jobs) - MAX_JOBS_KEPT]:
+                del jobs[old.id]
+    executor.submit(run, job, store, writer, encode, on_done)
+    return job
+
+def get_job(job_id):
+    return jobs.get(job_id)
@@ -0,0 +1,182 @@
+import os
+import re
+import json
+import numpy as np
+from row_store import is_text
+
+# Per-segment BM25 inverted index over the tokens of every cell, built when a
+# segment is written:
+#   terms.strings / terms.offsets -> vocabulary, sorted so lookups can bisect
+#   starts   int64  -> offset of each term's postings
+#   postings int32  -> row ids, ascending within a term
+#   tfs      uint16 -> occurrences of the term in the row
+#   lengths  int32  -> tokens per row
+
+SPEC_FILE = "bm25.json"
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# terms in more than this share of rows carry almost no signal and are skipped
+BM25_MAX_DF = float(os.getenv("BM25_MAX_DF", "0.5"))
+# reciprocal rank fusion constant: larger values flatten the rank weights
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+COMPOUND = re.compile(r"[^\W_]+(?:[-._/:_][^\W_]+)*")
+PARTS = re.compile(r"[^\W_]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "for", "from", "how", "in", "is", "it",
+    "me", "many", "much", "of", "on", "or", "show", "tell", "the", "to", "was", "were",
+    "what", "when", "where", "which", "who", "with",
+}
+
+def tokenize(text):
+    tokens = []
+    for word in COMPOUND.findall(text.lower()):
+        tokens.append(word)
+        parts = PARTS.findall(word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+def query_tokens(query):
+    return [t for t in dict.fromkeys(tokenize(query)) if t not in STOPWORDS]
+
+def column_values(rows, i, col):
+    if is_text(col):
+        return np.asarray(rows.array(i, "codes", "int32")), rows.strings(i)
+    values = np.asarray(rows.array(i, "values", "float64"))
+    present = ~np.isnan(values)
+    distinct, inverse = np.unique(values[present], return_inverse=True)
+    codes = np.full(len(values), -1, dtype="int64")
+    codes[present] = inverse
+    return codes, [str(rows.render(i, v)) for v in distinct]
+
+def build(rows, path):
+    os.makedirs(path, exist_ok=True)
+    n = len(rows)
+    vocab = {}
+    pair_rows, pair_terms = [], []
+    for i, col in enumerate(rows.columns):
+        codes, strings = column_values(rows, i, col)
+        # each distinct value is tokenized once and expanded to its rows
+        per_value = [[vocab.setdefault(t, len(vocab)) for t in tokenize(s)] for s in strings]
+        counts = np.array([len(t) for t in per_value], dtype="int64")
+        flat = np.array([t for ts in per_value for t in ts], dtype="int64")
+        starts = np.concatenate([[0], np.cumsum(counts)])
+        present = np.flatnonzero(codes >= 0)
+        value = codes[present]
+        n_tokens = counts[value] if len(counts) else np.zeros(0, dtype="int64")
+        total = int(n_tokens.sum())
+        if not total:
+            continue
+        first = np.cumsum(n_tokens) - n_tokens
+        pair_rows.append(np.repeat(present, n_tokens))
+        pair_terms.append(flat[np.repeat(starts[value] - first, n_tokens) + np.arange(total)])
+
+    terms = sorted(vocab)
+    rank = np.empty(len(vocab), dtype="int64")
+    rank[[vocab[t] for t in terms]] = np.arange(len(terms))
+    row_ids = np.concatenate(pair_rows) if pair_rows else np.zeros(0, dtype="int64")
+    term_ids = rank[np.concatenate(pair_terms)] if pair_terms else np.zeros(0, dtype="int64")
+    keys, tfs = np.unique(term_ids * max(n, 1) + row_ids, return_counts=True)
+    df = np.bincount(keys // max(n, 1), minlength=len(terms))
+
+    encoded = [t.encode("utf-8") for t in terms]
+    offsets = np.concatenate([[0], np.cumsum([len(t) for t in encoded])]).astype("int64")
+    with open(os.path.join(path, "terms.strings"), "wb") as f:
+        f.write(b"".join(encoded))
+    offsets.tofile(os.path.join(path, "terms.offsets"))
+    np.concatenate([[0], np.cumsum(df)]).astype("int64").tofile(os.path.join(path, "starts"))
+    (keys % max(n, 1)).astype("int32").tofile(os.path.join(path, "postings"))
+    np.minimum(tfs, 65535).astype("uint16").tofile(os.path.join(path, "tfs"))
+    lengths = np.bincount(row_ids, minlength=n).astype("int32")
+    lengths.tofile(os.path.join(path, "lengths"))
+    tmp = os.path.join(path, SPEC_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"rows": n, "terms": len(terms), "avgdl": float(lengths.mean()) if n else 0.0}, f)
+    os.replace(tmp, os.path.join(path, SPEC_FILE))
+    return LexicalIndex(path)
+
+class LexicalIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, SPEC_FILE), "r") as f:
+            spec = json.load(f)
+        self.rows = spec["rows"]
+        self.terms = spec["terms"]
+        self.avgdl = spec["avgdl"] or 1.0
+        self.maps = {}
+
+    def array(self, name, dtype):
+        if name not in self.maps:
+            path = os.path.join(self.path, name)
+            if os.path.getsize(path) == 0:
+                self.maps[name] = np.zeros(0, dtype=dtype)
+            else:
+                self.maps[name] = np.memmap(path, dtype=dtype, mode="r")
+        return self.maps[name]
+
+    def term(self, t):
+        offsets = self.array("terms.offsets", "int64")
+        data = self.array("terms.strings", "uint8")
+        return bytes(data[offsets[t]:offsets[t + 1]]).decode("utf-8")
+
+    def lookup(self, token):
+        lo, hi = 0, self.terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < token:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.terms and self.term(lo) == token else None
+
+    # BM25 scores of the rows containing any of the tokens
+    def scores(self, tokens, candidates=None):
+        starts = self.array("starts", "int64")
+        postings = self.array("postings", "int32")
+        tfs = self.array("tfs", "uint16")
+        lengths = self.array("lengths", "int32")
+        docs, weights = [], []
+        for token in tokens:
+            t = self.lookup(token)
+            if t is None:
+                continue
+            s, e = starts[t], starts[t + 1]
+            df = e - s
+            if df > BM25_MAX_DF * self.rows:
+                continue
+            idf = np.log(1 + (self.rows - df + 0.5) / (df + 0.5))
+            d = np.asarray(postings[s:e])
+            tf = np.asarray(tfs[s:e], dtype="float32")
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[d] / self.avgdl)
+            docs.append(d)
+            weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not docs:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+        d, w = np.concatenate(docs), np.concatenate(weights)
+        if candidates is not None:
+            keep = np.isin(d, candidates)
+            d, w = d[keep], w[keep]
+        ids, inverse = np.unique(d, return_inverse=True)
+        return ids.astype("int64"), np.bincount(inverse, weights=w).astype("float32")
+
+    def search(self, tokens, k, candidates=None):
+        ids, scores = self.scores(tokens, candidates)
+        if len(ids) > k:
+            top = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return scores[order], ids[order]
+
+# reciprocal rank fusion of several rankings (arrays of ids, best first)
+def rrf(rankings, k, rrf_k=RRF_K):
+    rankings = [r for r in rankings if len(r)]
+    if not rankings:
+        return np.zeros(0, dtype="float32"), np.zeros(0, dtype="int64")
+    ids = np.concatenate(rankings)
+    contrib = np.concatenate([1.0 / (rrf_k + np.arange(1, len(r) + 1)) for r in rankings])
+    unique, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=contrib)
+    order = np.argsort(-scores, kind="stable")[:k]
+    return scores[order].astype("float32"), unique[order]
@@ -0,0 +1,63 @@
+import os
+import json
+import httpx
+from metrics import counter, record
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+
+client = httpx.AsyncClient(base_url=OLLAMA_URL, timeout=httpx.Timeout(LLM_TIMEOUT, connect=10))
+
+async def close():
+    await client.aclose()
+
+prompt_tokens = counter("ollama_prompt_tokens_total", "Prompt tokens evaluated by Ollama")
+eval_tokens = counter("ollama_eval_tokens_total", "Tokens generated by Ollama")
+
+# Ollama reports its own timings (in nanoseconds) on the final chunk
+def record_usage(chunk):
+    if "eval_duration" not in chunk:
+        return
+    record("llm_prompt_eval", chunk.get("prompt_eval_duration", 0) / 1e9)
+    record("llm_eval", chunk["eval_duration"] / 1e9)
+    prompt_tokens.inc(chunk.get("prompt_eval_count", 0))
+    eval_tokens.inc(chunk.get("eval_count", 0))
+
+def chat_body(prompt, stream):
+    return {"model": OLLAMA_MODEL, "messages": [{"role": "user", "content": prompt}], "stream": stream}
+
+def generate_body(prompt, stream):
+    return {"model": OLLAMA_MODEL, "prompt": prompt, "stream": stream}
+
+async def post(path, body):
+    r = await client.post(path, json=body)
+    r.raise_for_status()
+    res = r.json()
+    record_usage(res)
+    return res
+
+async def stream(path, body):
+    async with client.stream("POST", path, json=body) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("done"):
+                record_usage(chunk)
+            yield chunk
+            if chunk.get("done"):
+                break
+
+async def chat(prompt):
+    return await post("/api/chat", chat_body(prompt, False))
+
+def chat_stream(prompt):
+    return stream("/api/chat", chat_body(prompt, True))
+
+async def generate(prompt):
+    return await post("/api/generate", generate_body(prompt, False))
+
+def generate_stream(prompt):
+    return stream("/api/generate", generate_body(prompt, True))
@@ -0,0 +1,92 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from metrics import histogram, note
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))
+DEFAULT_PRIORITY = 1
+# the X-Client-Id and X-Priority headers are only honoured when the server is
+# reached through a trusted proxy that sets them; priorities are clamped to 0..LLM_MAX_PRIORITY
+LLM_TRUST_CLIENT_HEADERS = os.getenv("LLM_TRUST_CLIENT_HEADERS", "0") == "1"
+LLM_MAX_PRIORITY = int(os.getenv("LLM_MAX_PRIORITY", "9"))
+
+queue_wait = histogram("llm_queue_wait_seconds", "Time a generation waited for a free LLM slot")
+
+# Bounds the number of generations running against Ollama at once. Waiting
+# requests are ordered by priority (lower first) and, within a priority, by
+# start-time fair queuing: each client's next request is tagged one step after
+# its previous one, so a client with many queued questions cannot starve others.
+class LLMScheduler:
+    def __init__(self, max_in_flight=LLM_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiting = []
+        self.seq = itertools.count()
+        self.virtual_time = 0
+        self.client_tags = {}
+        self.completed = 0
+
+    def tag(self, client):
+        tag = max(self.virtual_time, self.client_tags.get(client, 0)) + 1
+        self.client_tags[client] = tag
+        if len(self.client_tags) > 10000:
+            self.client_tags = {c: t for c, t in self.client_tags.items() if t > self.virtual_time}
+        return tag
+
+    async def acquire(self, client, priority):
+        start = time.perf_counter()
+        # a free slot means nobody live is waiting: release() hands slots to waiters first
+        if self.in_flight < self.max_in_flight:
+            self.in_flight += 1
+            queue_wait.observe(0.0)
+            note("llm_queue", 0.0)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        entry = [priority, self.tag(client), next(self.seq), fut]
+        heapq.heappush(self.waiting, entry)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the slot was handed over just as the caller went away
+                self.release()
+            else:
+                entry[3] = None
+            raise
+        wait = time.perf_counter() - start
+        queue_wait.observe(wait)
+        note("llm_queue", wait)
+
+    def release(self):
+        self.in_flight -= 1
+        while self.waiting:
+            priority, tag, _, fut = heapq.heappop(self.waiting)
+            if fut is None or fut.done():
+                continue
+            self.virtual_time = tag
+            self.in_flight += 1
+            fut.set_result(None)
+            break
+
+    @asynccontextmanager
+    async def slot(self, client="anonymous", priority=DEFAULT_PRIORITY):
+        await self.acquire(client, priority)
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self.release()
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queued": sum(1 for e in self.waiting if e[3] is not None and not e[3].done()),
+            "completed": self.completed,
+            "queue_wait_seconds": queue_wait.snapshot(),
+        }
+
+scheduler = LLMScheduler()
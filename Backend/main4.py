@@ -1,24 +1,46 @@
 import os
-import json
-import base64
-import io
+import time
+import shutil
 import re
-import numpy as np
-import pandas as pd
-import faiss
-import ollama
-import requests
+from contextlib import asynccontextmanager
 import mysql.connector
-import matplotlib.pyplot as plt
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-from sklearn.preprocessing import normalize
 from typing import List, Dict, Optional
+from vector_index import TOP_K
+from csv_collections import CollectionManager, collection_name
+import ingest
+from ingest import EMBED_BATCH
+from embedding_cache import EmbeddingCache
+from embedding_service import EmbeddingService, EMBED_DIMENSION, EMBED_WARMUP
+from query_parser import extract_filters
+from streaming import sse, StreamFormatter, format_text
+import llm_client
+from llm_scheduler import scheduler, DEFAULT_PRIORITY, LLM_TRUST_CLIENT_HEADERS, LLM_MAX_PRIORITY
+from response_cache import ResponseCache
+from db_pool import ConnectionPool, PoolTimeout, MYSQL_USE_PURE
+import mysql_browse
+from schema_catalog import SchemaCatalog
+import text_to_sql
+import context_builder
+from charts import gen_chart_data
+from chart_render import ChartRenderer
+from reranker import Reranker
+import aggregate_router
+from aggregate_router import AGGREGATE_ANSWERS
+from context_builder import estimate_tokens
+import metrics
+from metrics import span
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await llm_client.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -27,102 +49,260 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Server-Timing header with the stages a request went through, for every
+# request when SERVER_TIMING=1 or for those sending "X-Timing: 1". Streaming
+# responses only list the stages finished before the first event.
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    if not SERVER_TIMING and request.headers.get("x-timing") != "1":
+        return await call_next(request)
+    timings = {}
+    token = metrics.request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.request_timings.reset(token)
+    timings["total"] = time.perf_counter() - start
+    response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
 CSV_FOLDER = "data"
 INDEX_FOLDER = "index_store"
 INDEX_PATH = os.path.join(INDEX_FOLDER, "csv_index.faiss")
 METADATA_PATH = os.path.join(INDEX_FOLDER, "csv_metadata.json")
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
 os.makedirs(CSV_FOLDER, exist_ok=True)
 os.makedirs(INDEX_FOLDER, exist_ok=True)
 
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-dimension = 384
-index = faiss.IndexFlatL2(dimension)
-if os.path.exists(INDEX_PATH) and os.path.exists(METADATA_PATH):
-    index = faiss.read_index(INDEX_PATH)
-    with open(METADATA_PATH, "r") as f:
-        metadata = json.load(f)
-else:
-    metadata = []
+embedder = EmbeddingService(batch_size=EMBED_BATCH)
+if EMBED_WARMUP:
+    embedder.warmup()
+dimension = EMBED_DIMENSION
+collections = CollectionManager(INDEX_FOLDER, dimension, INDEX_PATH, METADATA_PATH)
+
+embedding_cache = EmbeddingCache(os.path.join(INDEX_FOLDER, "embedding_cache.sqlite"), dimension)
+
+def encode_docs(docs):
+    return embedder.encode(docs)
 
-def row_to_text(row):
-    return ", ".join([f"{col}: {row[col]}" for col in row.index])
+def embed_docs(docs):
+    return embedding_cache.encode(docs, encode_docs)
+
+response_cache = ResponseCache(embed=encode_docs)
+chart_renderer = ChartRenderer()
+reranker = Reranker()
+aggregate_answers = metrics.counter("csv_aggregate_answers_total", "CSV questions answered from the aggregate tables")
 
 @app.post("/upload_csv")
-def upload_csv(file: UploadFile = File(...)):
-    file_location = os.path.join(CSV_FOLDER, file.filename)
-    with open(file_location, "wb") as f:
-        f.write(file.file.read())
-    df = pd.read_csv(file_location)
-    docs = df.apply(row_to_text, axis=1).tolist()
-    new_embeddings = normalize(embed_model.encode(docs), norm='l2', axis=1)
-    global index, metadata
-    if os.path.exists(INDEX_PATH) and os.path.exists(METADATA_PATH):
-        index = faiss.read_index(INDEX_PATH)
-        with open(METADATA_PATH, "r") as f:
-            existing_metadata = json.load(f)
-        index.add(np.array(new_embeddings))
-        existing_metadata.extend(df.to_dict(orient="records"))
-        metadata = existing_metadata
-    else:
-        index = faiss.IndexFlatL2(dimension)
-        index.add(np.array(new_embeddings))
-        metadata = df.to_dict(orient="records")
-    faiss.write_index(index, INDEX_PATH)
-    with open(METADATA_PATH, "w") as f:
-        json.dump(metadata, f)
-    return {"message": "CSV uploaded and indexed successfully"}
-
-def extract_query_attributes(query, records):
-    attrs = {}
-    for record in records:
-        for key in record:
-            match = re.search(rf"{key}\s*:\s*(.+?)(?=\s*\w+[:]|$)", query, re.IGNORECASE)
-            if match:
-                val = match.group(1).strip()
-                if re.match(r"^\d{4}-\d{2}-\d{2}$", val):
-                    attrs[key] = datetime.strptime(val, "%Y-%m-%d")
-                elif re.match(r"^\d+(\.\d+)?$", val):
-                    attrs[key] = float(val) if "." in val else int(val)
-                else:
-                    attrs[key] = val
-    return attrs
-
-def retrieve_context(query):
-    if not metadata:
-        return None
-    q_emb = normalize(embed_model.encode([query]), norm='l2', axis=1)
-    dists, ids = index.search(np.array(q_emb), len(metadata))
-    rows = [metadata[i] for i in ids[0] if i < len(metadata)]
-    attrs = extract_query_attributes(query, rows)
-    for k,v in attrs.items():
-        rows = [r for r in rows if (isinstance(v, datetime) and datetime.strptime(r.get(k,""), "%Y-%m-%d")==v) or r.get(k)==v]
-    return rows[0] if rows else None
-
-def format_context(ctx):
-    if not ctx:
-        return "No relevant data found."
-    return (f"On {ctx.get('business_date','?')}, at {ctx.get('business_unit','?')}, "
-            f"balance tier {ctx.get('balance_tier_description','?')}, "
-            f"total balance {ctx.get('total_balance',0):,.2f} IDR, "
-            f"{ctx.get('no_of_customers',0)} customers.")
+def upload_csv(file: UploadFile = File(...), collection: Optional[str] = None):
+    name = collection or collection_name(file.filename)
+    try:
+        store, writer = collections.open_writer(name)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    job_id, file_location = ingest.upload_path(CSV_FOLDER, file.filename)
+    try:
+        with open(file_location, "wb") as f:
+            shutil.copyfileobj(file.file, f, 1024 * 1024)
+    except Exception:
+        writer.abort()
+        raise
+
+    def on_done():
+        collections.refresh(name, store)
+        response_cache.invalidate("csv")
 
-def format_text(txt):
-    return re.sub(r"(\d+\.)\s*", r"\n\1 ", txt).strip()
+    job = ingest.submit(file.filename, file_location, store, writer, embed_docs, on_done=on_done, job_id=job_id)
+    return {"message": "CSV uploaded, indexing started", "job_id": job.id, "collection": name}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = ingest.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
+
+# the question's embedding, computed at most once per request and only if
+# routing or retrieval needs it
+def query_embedding(query):
+    cached = []
+
+    def get():
+        if not cached:
+            with span("embed_query"):
+                cached.append(embedder.encode_query(query)[None, :])
+        return cached[0]
+    return get
+
+# when no collection is named by the question, the open one holding the row
+# nearest to it answers
+def route(query, embedding):
+    return collections.route(query, lambda store: store.nearest(embedding()))
+
+def retrieve_context(query, collection=None, k=TOP_K, embedding=None):
+    embedding = embedding or query_embedding(query)
+    with span("route"):
+        name = collection or route(query, embedding)
+        store = collections.get(name) if name else None
+    if not store or not len(store):
+        return name, None
+    with span("extract_filters"):
+        filters = extract_filters(query, store.columns(), store.knows)
+    q_emb = embedding()
+    scores, ids = store.hybrid_search(q_emb, query, k, filters)
+    with span("fetch_rows"):
+        rows = [store.row(i) for i in ids]
+    with span("rerank"):
+        rows = [rows[i] for i in reranker.rerank(query, rows)]
+    return name, rows
+
+# the reranked rows as one table within the context token budget
+def format_context(name, rows, query):
+    if not rows:
+        return "No relevant data found."
+    return f"From {name}:\n" + context_builder.build(rows, query)
 
 class CSVQuery(BaseModel):
     query: str
+    collection: Optional[str] = None
+
+# -> (context, prompt, direct); aggregate questions are answered from the
+# tables built at upload, and a direct answer needs no LLM call
+def csv_prompt(query, collection=None):
+    embedding = query_embedding(query)
+    if AGGREGATE_ANSWERS != "off":
+        with span("route"):
+            collection = collection or route(query, embedding)
+            store = collections.get(collection) if collection else None
+        if store is not None and len(store):
+            with span("aggregate"):
+                answer = aggregate_router.answer(store, query)
+            if answer is not None:
+                aggregate_answers.inc()
+                return answer, f"Context: {answer}\nQuestion: {query}", AGGREGATE_ANSWERS == "direct"
+    fmt = format_context(*retrieve_context(query, collection, embedding=embedding), query)
+    return fmt, f"Context: {fmt}\nQuestion: {query}", False
+
+def check_collection(name):
+    if name is not None and name not in collections.catalog:
+        raise HTTPException(404, f"Unknown collection {name}")
+
+def client_of(request: Request):
+    address = request.client.host if request.client else "anonymous"
+    if not LLM_TRUST_CLIENT_HEADERS:
+        return address
+    return request.headers.get("x-client-id") or address
+
+def priority_of(request: Request):
+    if not LLM_TRUST_CLIENT_HEADERS:
+        return DEFAULT_PRIORITY
+    try:
+        priority = int(request.headers.get("x-priority", DEFAULT_PRIORITY))
+    except ValueError:
+        return DEFAULT_PRIORITY
+    return max(0, min(priority, LLM_MAX_PRIORITY))
 
 @app.post("/query")
-def query_csv(request: CSVQuery):
-    ctx = retrieve_context(request.query)
-    fmt = format_context(ctx)
-    input_text = f"Context: {fmt}\nQuestion: {request.query}"
+async def query_csv(request: CSVQuery, http: Request):
+    check_collection(request.collection)
+    fmt, input_text, direct = await run_in_threadpool(csv_prompt, request.query, request.collection)
+    if direct:
+        return {"response": fmt, "context": fmt}
+    cached = await run_in_threadpool(response_cache.get, "csv", fmt, request.query)
+    if cached is not None:
+        return {"response": cached, "context": fmt}
     try:
-        res = ollama.chat(model="mistral", messages=[{"role":"user","content":input_text}])
-        return {"response": format_text(res["message"]["content"]), "context": fmt}
+        async with scheduler.slot(client_of(http), priority_of(http)):
+            with span("llm"):
+                res = await llm_client.chat(input_text)
+        answer = format_text(res["message"]["content"])
+        await run_in_threadpool(response_cache.put, "csv", fmt, request.query, answer)
+        return {"response": answer, "context": fmt}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def query_csv_stream(request: CSVQuery, http: Request):
+    check_collection(request.collection)
+    fmt, input_text, direct = await run_in_threadpool(csv_prompt, request.query, request.collection)
+    cached = fmt if direct else await run_in_threadpool(response_cache.get, "csv", fmt, request.query)
+
+    async def events():
+        yield sse("context", {"context": fmt})
+        if cached is not None:
+            yield sse("token", {"text": cached})
+            yield sse("done", {"aggregate": True} if direct else {"cached": True})
+            return
+        formatter = StreamFormatter()
+        answer = []
+        try:
+            async with scheduler.slot(client_of(http), priority_of(http)):
+                with span("llm"):
+                    async for chunk in llm_client.chat_stream(input_text):
+                        text = formatter.feed(chunk.get("message", {}).get("content", ""))
+                        if text:
+                            answer.append(text)
+                            yield sse("token", {"text": text})
+            answer.append(formatter.flush())
+            yield sse("token", {"text": answer[-1]})
+            await run_in_threadpool(response_cache.put, "csv", fmt, request.query, "".join(answer))
+            yield sse("done", {})
+        except Exception as e:
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/collections")
+def list_collections():
+    return collections.info()
+
+@app.delete("/collections/{name}")
+def drop_collection(name: str):
+    try:
+        dropped = collections.drop(name)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    if not dropped:
+        raise HTTPException(404, f"Unknown collection {name}")
+    response_cache.invalidate("csv")
+    return {"message": f"Collection {name} dropped"}
+
+@app.post("/collections/{name}/query")
+async def query_collection(name: str, request: CSVQuery, http: Request):
+    request.collection = name
+    return await query_csv(request, http)
+
+@app.post("/collections/{name}/query/stream")
+async def query_collection_stream(name: str, request: CSVQuery, http: Request):
+    request.collection = name
+    return await query_csv_stream(request, http)
+
+@app.get("/embedding/stats")
+def embedding_stats():
+    return embedder.stats()
+
+@app.get("/rerank/stats")
+def rerank_stats():
+    return reranker.stats()
+
+@app.get("/snapshots/stats")
+def snapshot_stats():
+    return collections.snapshot_stats()
+
+@app.get("/scheduler/stats")
+def scheduler_stats():
+    return scheduler.stats()
+
+@app.get("/response_cache/stats")
+def response_cache_stats():
+    return response_cache.stats()
+
 DB_CONFIG = {"host": "", "user": "", "password": "", "database": ""}
 
 class MySQLCredentials(BaseModel):
@@ -131,162 +311,245 @@ class MySQLCredentials(BaseModel):
     password: Optional[str] = ""
     database: str
 
+db_pool = None
+
 @app.post("/update_mysql_credentials")
 def update_mysql_credentials(creds: MySQLCredentials):
-    global DB_CONFIG
+    global DB_CONFIG, db_pool
     DB_CONFIG = creds.dict()
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = mysql.connector.connect(**DB_CONFIG, use_pure=MYSQL_USE_PURE)
         conn.close()
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=f"Connection failed: {err}")
+    old, db_pool = db_pool, ConnectionPool(DB_CONFIG)
+    if old:
+        old.close()
+    schema.invalidate()
     return {"message": "MySQL credentials updated"}
 
 def get_db_connection():
+    if not db_pool:
+        return None
     try:
-        return mysql.connector.connect(**DB_CONFIG, use_pure=True)
-    except mysql.connector.Error:
+        return db_pool.get()
+    except (mysql.connector.Error, PoolTimeout):
         return None
 
+schema = SchemaCatalog(get_db_connection)
+
+@app.get("/db_pool/stats")
+def db_pool_stats():
+    return db_pool.stats() if db_pool else {}
+
 @app.get("/get_table_list")
 def get_table_list():
-    conn = get_db_connection()
-    if not conn:
+    try:
+        return schema.table_names()
+    except mysql.connector.Error:
+        raise HTTPException(500, "DB connect error")
+
+@app.get("/schema")
+def get_schema(refresh: bool = False):
+    try:
+        return schema.snapshot(force=refresh)
+    except mysql.connector.Error:
         raise HTTPException(500, "DB connect error")
-    cur = conn.cursor()
-    cur.execute("SHOW TABLES")
-    tables = [r[0] for r in cur.fetchall()]
-    cur.close(); conn.close()
-    return tables
 
 @app.get("/get_mysql_data/{table}")
-def get_mysql_data(table: str):
+def get_mysql_data(table: str, limit: int = 100, after: Optional[str] = None,
+                   columns: Optional[str] = None, sort: Optional[str] = None,
+                   filter: List[str] = Query(default=[])):
+    try:
+        info = schema.table(table)
+    except mysql.connector.Error:
+        raise HTTPException(500, "DB connect error")
+    if not info:
+        raise HTTPException(404, f"Unknown table {table}")
+    try:
+        page = mysql_browse.prepare(info, table, limit, after, columns, sort, filter)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     conn = get_db_connection()
     if not conn:
         raise HTTPException(500, "DB connect error")
-    cur = conn.cursor(dictionary=True)
-    cur.execute(f"SELECT * FROM `{table}` LIMIT 100")
-    rows = cur.fetchall()
-    cur.close(); conn.close()
-    if rows and "id" not in rows[0]:
-        for i,row in enumerate(rows):
-            row["id"] = i
-    return rows
+    try:
+        body = mysql_browse.start(conn, page)
+    except mysql.connector.Error as e:
+        raise HTTPException(500, f"Query failed: {e}")
+    return StreamingResponse(body, media_type="application/json")
 
 class MySQLQuery(BaseModel):
     query: str
-    selectedRows: List[Dict]
-
-def is_numeric(v):
-    try: float(v); return True
-    except: return False
-
-COLUMN_SYNONYMS = {
-    "sales": "store_sales",
-    "income": "store_sales",
-    "revenue": "store_sales",
-    "customers": "no_of_customers",
-    "length": "length",
-    "balance": "total_balance",
-    "quantity": "quantity",
-    "amount": "total_balance",
-    "id": "id"
-}
-
-def gen_chart_data(rows: List[Dict], user_query: str = "") -> Dict:
-    if not rows:
-        return None
-    sample = rows[0]
-    numeric_columns = [k for k, v in sample.items() if is_numeric(v)]
-    categorical_columns = [k for k in sample if k not in numeric_columns]
-    if not numeric_columns:
-        return None
-    user_query_lower = user_query.lower()
-    preferred_col = None
-    for word in user_query_lower.split():
-        if word in COLUMN_SYNONYMS:
-            candidate = COLUMN_SYNONYMS[word]
-            if candidate in numeric_columns:
-                preferred_col = candidate
-                break
-    if not preferred_col:
-        for col in numeric_columns:
-            if col.lower() in user_query_lower:
-                preferred_col = col
-                break
-    if not preferred_col:
-        preferred_col = numeric_columns[0]
-    x_col = categorical_columns[0] if categorical_columns else "index"
-    labels = [str(row.get(x_col, f"Row {i+1}")) for i, row in enumerate(rows)]
-    values = [float(row[preferred_col]) for row in rows if is_numeric(row[preferred_col])]
-    return {
-        "labels": labels,
-        "datasets": [
-            {
-                "label": preferred_col,
-                "data": values,
-                "backgroundColor": "rgba(75, 192, 192, 0.6)"
-            }
-        ]
-    }
+    selectedRows: List[Dict] = []
+    table: Optional[str] = None
+    # "rows" answers from selectedRows, "sql" lets the model query the database
+    mode: str = "rows"
 
-def gen_image(rows: List[Dict], user_query: str = "") -> str:
-    chart_data = gen_chart_data(rows, user_query)
-    if not chart_data:
-        return None
-    labels = chart_data["labels"]
-    values = chart_data["datasets"][0]["data"]
-    y_label = chart_data["datasets"][0]["label"]
-    plt.figure(figsize=(6, 4))
-    plt.bar(labels, values, color="skyblue")
-    plt.xlabel("Category")
-    plt.ylabel(y_label)
-    plt.title(f"{y_label} by Category")
-    plt.xticks(rotation=45)
-    min_val = min(values)
-    max_val = max(values)
-    margin = (max_val - min_val) * 0.05 or 1
-    plt.ylim(min_val - margin, max_val + margin)
-    tick_interval = max((max_val - min_val) / 5, 1)
-    ticks = [round(min_val + i * tick_interval, 2) for i in range(6)]
-    plt.yticks(ticks)
-    plt.tight_layout()
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format="png")
-    plt.close()
-    buffer.seek(0)
-    return base64.b64encode(buffer.read()).decode("utf-8")
+def value_kind(v):
+    return "number" if isinstance(v, (int, float)) and not isinstance(v, bool) else "text"
 
-@app.post("/query_mysql_ai")
-def query_mysql_ai(req: MySQLQuery):
-    if not req.query:
-        raise HTTPException(400, "Empty query")
+# column kinds of the selected rows: declared MySQL types when the table is
+# known, otherwise the JSON types of the first row
+def row_kinds(req: MySQLQuery) -> Dict[str, str]:
+    declared = {}
+    if req.table:
+        try:
+            declared = schema.column_kinds(req.table)
+        except mysql.connector.Error:
+            pass
+    sample = req.selectedRows[0] if req.selectedRows else {}
+    return {k: declared.get(k) or value_kind(v) for k, v in sample.items()}
+
+def mysql_prompt(req: MySQLQuery):
+    with span("schema"):
+        kinds = row_kinds(req)
+        info = None
+        if req.table and req.selectedRows:
+            try:
+                info = schema.table(req.table)
+            except mysql.connector.Error:
+                pass
+    with span("build_context"):
+        ctx = context_builder.build(req.selectedRows, req.query, kinds)
+    if info:
+        types = ", ".join(f"{c['name']} {c['type']}" for c in info["columns"] if c["name"] in req.selectedRows[0])
+        ctx = f"Table {req.table} ({types})\n{ctx}"
+
+    return ctx, answer_prompt(ctx, req.query)
 
-    ctx = "\n".join(
-        f"Row {i+1}: " + ", ".join(f"{k}: {v}" for k, v in row.items())
-        for i, row in enumerate(req.selectedRows)
-    ) or "No data selected."
+def answer_prompt(ctx, query):
+    cleaned = re.sub(r"\b(chart|graph|plot|visualization)\b", "summary", query, flags=re.IGNORECASE)
+    return f"Context:\n{ctx}\n\nQuestion:\n{cleaned}"
 
-    cleaned = re.sub(r"\b(chart|graph|plot|visualization)\b", "summary", req.query, flags=re.IGNORECASE)
-    prompt = f"Context:\n{ctx}\n\nQuestion:\n{cleaned}"
+async def generate_sql(req: MySQLQuery, http: Request):
+    with span("schema"):
+        tables = (await run_in_threadpool(schema.snapshot))["tables"]
+    prompt = text_to_sql.sql_prompt(tables, req.query)
+    sql = await run_in_threadpool(response_cache.get, "sql", prompt, req.query)
+    if sql is None:
+        async with scheduler.slot(client_of(http), priority_of(http)):
+            with span("llm_sql"):
+                reply = (await llm_client.generate(prompt)).get("response", "")
+        sql = text_to_sql.validate(text_to_sql.extract_sql(reply), tables)
+        await run_in_threadpool(response_cache.put, "sql", prompt, req.query, sql)
+    return sql
 
+def run_sql(sql):
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(500, "DB connect error")
+    with conn, span("run_sql"):
+        return text_to_sql.run(conn, sql)
+
+# -> (ctx, prompt, rows, kinds, sql); in "sql" mode MySQL computes the answer
+# and only its result reaches the prompt
+async def mysql_context(req: MySQLQuery, http: Request):
+    if req.mode != "sql":
+        ctx, prompt = await run_in_threadpool(mysql_prompt, req)
+        return ctx, prompt, req.selectedRows, None, None
     try:
-        r = requests.post("http://localhost:11434/api/generate", json={
-            "model": "mistral",
-            "prompt": prompt,
-            "stream": False
-        })
-        r.raise_for_status()
-        ai_resp = r.json().get("response", "")
-    except:
+        sql = await generate_sql(req, http)
+    except text_to_sql.UnsafeSQL as e:
+        raise HTTPException(400, f"Rejected SQL: {e}")
+    except mysql.connector.Error:
+        raise HTTPException(500, "DB connect error")
+    except Exception:
         raise HTTPException(500, "AI error")
+    try:
+        columns, rows, truncated = await run_in_threadpool(run_sql, sql)
+    except mysql.connector.Error as e:
+        raise HTTPException(400, f"Query failed: {e}")
+    kinds = text_to_sql.result_kinds(columns, rows)
+    with span("build_context"):
+        result = await run_in_threadpool(context_builder.build, rows, req.query, kinds)
+    if truncated:
+        result += f"\n(query stopped after {len(rows)} rows)"
+    ctx = f"SQL:\n{sql}\n\nResult:\n{result}"
+    return ctx, answer_prompt(ctx, req.query), rows, kinds, sql
 
+def chart_payload(req: MySQLQuery, rows: List[Dict] = None, kinds: Dict[str, str] = None):
+    rows = req.selectedRows if rows is None else rows
     user_query_lower = req.query.lower()
     return_chart = "chart" in user_query_lower
     return_graph = "graph" in user_query_lower
-
+    if (return_chart or return_graph) and kinds is None:
+        kinds = row_kinds(req)
+    chart_data = None
+    if return_chart or return_graph:
+        with span("chart_data"):
+            chart_data = gen_chart_data(rows, req.query, kinds)
+    image_url = None
+    if return_graph and chart_data:
+        with span("chart_image"):
+            image_url = f"/charts/{chart_renderer.render(chart_data)}.png"
     return {
-        "response": ai_resp,
-        "chartData": gen_chart_data(req.selectedRows, req.query) if return_chart else None,
-        "imageBase64": gen_image(req.selectedRows, req.query) if return_graph else None
-    }
\ No newline at end of file
+        "chartData": chart_data if return_chart else None,
+        "imageUrl": image_url
+    }
+
+@app.get("/charts/{key}.png")
+def get_chart(key: str, http: Request):
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    png = chart_renderer.read(key)
+    if png is None:
+        raise HTTPException(404, "Chart not found")
+    if http.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(png, media_type="image/png", headers=headers)
+
+@app.post("/query_mysql_ai")
+async def query_mysql_ai(req: MySQLQuery, http: Request):
+    if not req.query:
+        raise HTTPException(400, "Empty query")
+
+    ctx, prompt, rows, kinds, sql = await mysql_context(req, http)
+    ai_resp = await run_in_threadpool(response_cache.get, "mysql", ctx, req.query)
+
+    if ai_resp is None:
+        try:
+            async with scheduler.slot(client_of(http), priority_of(http)):
+                with span("llm"):
+                    ai_resp = (await llm_client.generate(prompt)).get("response", "")
+        except:
+            raise HTTPException(500, "AI error")
+        await run_in_threadpool(response_cache.put, "mysql", ctx, req.query, ai_resp)
+
+    return {"response": ai_resp, "sql": sql, "context_tokens": estimate_tokens(ctx),
+            **(await run_in_threadpool(chart_payload, req, rows, kinds))}
+
+@app.post("/query_mysql_ai/stream")
+async def query_mysql_ai_stream(req: MySQLQuery, http: Request):
+    if not req.query:
+        raise HTTPException(400, "Empty query")
+
+    async def events():
+        try:
+            ctx, prompt, rows, kinds, sql = await mysql_context(req, http)
+        except HTTPException as e:
+            yield sse("error", {"detail": e.detail})
+            return
+        if sql:
+            yield sse("sql", {"sql": sql})
+        yield sse("context", {"context_tokens": estimate_tokens(ctx)})
+        cached = await run_in_threadpool(response_cache.get, "mysql", ctx, req.query)
+        if cached is not None:
+            yield sse("token", {"text": cached})
+        else:
+            answer = []
+            try:
+                async with scheduler.slot(client_of(http), priority_of(http)):
+                    with span("llm"):
+                        async for chunk in llm_client.generate_stream(prompt):
+                            if chunk.get("response"):
+                                answer.append(chunk["response"])
+                                yield sse("token", {"text": chunk["response"]})
+            except Exception:
+                yield sse("error", {"detail": "AI error"})
+                return
+            await run_in_threadpool(response_cache.put, "mysql", ctx, req.query, "".join(answer))
+        # charts are rendered after the answer so they never delay the first token
+        yield sse("done", await run_in_threadpool(chart_payload, req, rows, kinds))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,140 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def label_text(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in items) + "}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    # upper bucket bound below which the given fraction of observations fall
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+    def lines(self):
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        seen = 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            yield f"{self.name}_bucket{label_text(self.labels, {'le': bound})} {seen}"
+        yield f"{self.name}_bucket{label_text(self.labels, {'le': '+Inf'})} {count}"
+        yield f"{self.name}_sum{label_text(self.labels)} {total}"
+        yield f"{self.name}_count{label_text(self.labels)} {count}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+    def lines(self):
+        yield f"{self.name}{label_text(self.labels)} {self.value}"
+
+registry = {}
+registry_lock = threading.Lock()
+
+def metric(cls, name, labels, *args):
+    key = (name, tuple(sorted(labels.items())))
+    with registry_lock:
+        if key not in registry:
+            registry[key] = cls(name, *args, labels=labels)
+        return registry[key]
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+    return metric(Histogram, name, labels, help_text, buckets)
+
+def counter(name, help_text, **labels):
+    return metric(Counter, name, labels, help_text)
+
+# Prometheus text exposition of every registered metric
+def render():
+    with registry_lock:
+        metrics = sorted(registry.values(), key=lambda m: m.name)
+    out, family = [], None
+    for m in metrics:
+        if m.name != family:
+            family = m.name
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(m.lines())
+    return "\n".join(out) + "\n"
+
+# Stage timings of the current request, when it asked for them. Code run
+# through run_in_threadpool sees the same dict, so stages in worker threads
+# are attributed to the request that started them.
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def note(stage, seconds):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def record(stage, seconds):
+    histogram("stage_seconds", "Time spent in each pipeline stage", stage=stage).observe(seconds)
+    note(stage, seconds)
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+def server_timing(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,144 @@
+import re
+import json
+import base64
+from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+
+MAX_PAGE_SIZE = 1000
+FETCH_BATCH = 500
+FILTER = re.compile(r"^\s*(.+?)\s*(>=|<=|!=|=|>|<|~)\s*(.*)$")
+OPERATORS = {"=": "=", "!=": "<>", ">": ">", ">=": ">=", "<": "<", "<=": "<=", "~": "LIKE"}
+
+def quote(name):
+    return "`" + name.replace("`", "``") + "`"
+
+def encode_cursor(state):
+    raw = json.dumps(state, default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+def row_after(keys, cmp):
+    return f"({', '.join(quote(k) for k in keys)}) {cmp} ({', '.join(['%s'] * len(keys))})"
+
+class Page:
+    def __init__(self, sql, params, keys, limit, state):
+        self.sql = sql
+        self.params = params
+        self.keys = keys
+        self.limit = limit
+        self.state = state
+
+# Builds one page of a keyset-paginated browse: rows come back ordered by the
+# sort column and then the primary key, and the next page starts strictly
+# after the last (sort, pk) tuple, so no page ever scans the rows before it.
+# Tables without a primary key fall back to LIMIT/OFFSET.
+def prepare(info, table, limit=100, after=None, columns=None, sort=None, filters=()):
+    all_columns = [c["name"] for c in info["columns"]]
+    pk = info["primary_key"]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    state = decode_cursor(after) if after else {"n": 0}
+
+    desc = bool(sort) and sort.startswith("-")
+    sort_col = sort.lstrip("-") if sort else None
+    if sort_col and sort_col not in all_columns:
+        raise ValueError(f"Unknown sort column {sort_col}")
+    keys = ([sort_col] if sort_col else []) + [c for c in pk if c != sort_col]
+
+    projection = all_columns
+    if columns:
+        projection = [c.strip() for c in columns.split(",") if c.strip()]
+        unknown = [c for c in projection if c not in all_columns]
+        if unknown:
+            raise ValueError(f"Unknown columns {', '.join(unknown)}")
+        projection += [k for k in keys if k not in projection]
+
+    where, params = [], []
+    for f in filters:
+        m = FILTER.match(f)
+        if not m or m.group(1) not in all_columns:
+            raise ValueError(f"Invalid filter {f}")
+        column, op, value = m.groups()
+        where.append(f"{quote(column)} {OPERATORS[op]} %s")
+        params.append(f"%{value}%" if op == "~" else value)
+
+    if pk and "k" in state:
+        cmp = "<" if desc else ">"
+        last = state["k"]
+        if sort_col and sort_col not in pk:
+            # the sort column may hold NULLs, which MySQL sorts first ascending
+            # and last descending and which never compare true in a row value
+            col = quote(sort_col)
+            if last[0] is None:
+                cond = f"{col} IS NULL AND {row_after(keys[1:], cmp)}"
+                if not desc:
+                    cond += f" OR {col} IS NOT NULL"
+                params.extend(last[1:])
+            else:
+                cond = row_after(keys, cmp) + (f" OR {col} IS NULL" if desc else "")
+                params.extend(last)
+            where.append(f"({cond})")
+        else:
+            where.append(row_after(keys, cmp))
+            params.extend(last)
+
+    sql = f"SELECT {', '.join(quote(c) for c in projection)} FROM {quote(table)}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    order_keys = keys if pk else ([sort_col] if sort_col else [])
+    if order_keys:
+        sql += " ORDER BY " + ", ".join(quote(k) + (" DESC" if desc else "") for k in order_keys)
+    sql += " LIMIT %s"
+    params.append(limit)
+    if not pk:
+        sql += " OFFSET %s"
+        params.append(state.get("o", 0))
+    return Page(sql, params, keys if pk else [], limit, state)
+
+def cursor_value(value):
+    return str(value) if isinstance(value, Decimal) else value
+
+# Runs the page's query and fetches its first batch, so a failing query
+# raises here, before any response has been sent, rather than cutting the
+# body short; the returned generator streams the rest.
+def start(conn, page):
+    cur = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cur.execute(page.sql, page.params)
+        first = cur.fetchmany(FETCH_BATCH)
+    except Exception:
+        cur.close()
+        conn.close()
+        raise
+    return stream(conn, cur, page, first)
+
+# Streams {"rows": [...], "next_cursor": ...} from an unbuffered cursor, so
+# only one fetch batch is held in memory at a time.
+def stream(conn, cur, page, batch):
+    try:
+        yield b'{"rows": ['
+        count, last = 0, None
+        while batch:
+            for row in batch:
+                if "id" not in row:
+                    row["id"] = page.state["n"] + count
+                yield (b"," if count else b"") + json.dumps(jsonable_encoder(row)).encode("utf-8")
+                count += 1
+                last = row
+            batch = cur.fetchmany(FETCH_BATCH)
+        next_cursor = None
+        if count == page.limit:
+            state = {"n": page.state["n"] + count}
+            if page.keys:
+                state["k"] = [cursor_value(last[k]) for k in page.keys]
+            else:
+                state["o"] = page.state.get("o", 0) + count
+            next_cursor = encode_cursor(state)
+        yield b'], "next_cursor": ' + json.dumps(next_cursor).encode("utf-8") + b"}"
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,112 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+
+OPERATORS = [
+    (r">=|=>|\bat least\b", ">="),
+    (r"<=|=<|\bat most\b", "<="),
+    (r">|\bgreater than\b|\bmore than\b|\babove\b|\bover\b", ">"),
+    (r"<|\bless than\b|\bfewer than\b|\bbelow\b|\bunder\b", "<"),
+    (r"==|=|:|\bis\b|\bequals?\b", "="),
+]
+NUMBER = r"[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?(?:[eE][-+]?\d+)?"
+# "1 billion", "2.5jt", "500k"; balances are often quoted in IDR words too
+SCALES = {"k": 1e3, "thousand": 1e3, "rb": 1e3, "ribu": 1e3,
+          "m": 1e6, "mn": 1e6, "mio": 1e6, "million": 1e6, "jt": 1e6, "juta": 1e6,
+          "b": 1e9, "bn": 1e9, "billion": 1e9, "miliar": 1e9, "milyar": 1e9,
+          "t": 1e12, "tn": 1e12, "trillion": 1e12, "triliun": 1e12}
+SCALE = "|".join(sorted(SCALES, key=len, reverse=True))
+SCALED_NUMBER = rf"{NUMBER}(?:\s*(?:{SCALE}))?(?![\w])"
+DATE = r"\d{4}-\d{2}-\d{2}"
+QUOTED = r"\"[^\"]*\"|'[^']*'"
+SCALAR = rf"(?:{QUOTED}|{DATE}|{SCALED_NUMBER})"
+FULL_NUMBER = re.compile(rf"^(?P<number>{NUMBER})\s*(?P<scale>{SCALE})?$", re.IGNORECASE)
+FULL_DATE = re.compile(rf"^{DATE}$")
+
+def parse_value(text):
+    text = text.strip().strip("?.!").strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    if FULL_DATE.match(text):
+        try:
+            return datetime.strptime(text, "%Y-%m-%d")
+        except ValueError:
+            return text
+    m = FULL_NUMBER.match(text)
+    if m:
+        number = float(m.group("number").replace(",", "")) * SCALES.get((m.group("scale") or "").lower(), 1)
+        exact = not m.group("scale") and re.search(r"[.eE]", text)
+        return int(number) if number.is_integer() and not exact else number
+    return text
+
+def is_free_text(raw, value):
+    raw = raw.strip()
+    return isinstance(value, str) and not (len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "\"'")
+
+# the longest leading run of words in `text` that known() accepts, so
+# "BRI with the highest balance" still finds BRI
+def known_prefix(column, text, known):
+    words = text.strip().strip("?.!").split()
+    for end in range(len(words), 0, -1):
+        candidate = " ".join(words[:end])
+        if known(column, candidate):
+            return candidate
+    return None
+
+# Schema-aware extractor: one alternation over every column name, compiled
+# once per column set, so the cost of a query does not depend on the corpus.
+class QueryParser:
+    def __init__(self, columns):
+        self.columns = {self.normalize(c): c for c in columns}
+        names = sorted(columns, key=len, reverse=True)
+        # "total balance" matches the column total_balance
+        alternation = "|".join(re.escape(c).replace("_", "[_ ]").replace(r"\ ", "[_ ]") for c in names)
+        column = rf"(?<![\w])(?P<column>{alternation})(?![\w])"
+        ops = "|".join(f"(?:{pattern})" for pattern, _ in OPERATORS)
+        stop = rf"(?=\s*(?:,|;|$|\band\b\s*(?:{alternation})|(?:{alternation})\s*(?:{ops})))"
+        self.range_pattern = re.compile(
+            rf"{column}\s*(?:is\s+)?(?:between|from)\s+(?P<low>{SCALAR})\s+(?:and|to)\s+(?P<high>{SCALAR})",
+            re.IGNORECASE)
+        self.pattern = re.compile(
+            rf"{column}\s*(?:is\s+(?=(?:{ops})))?(?P<op>{ops})\s*(?P<value>{SCALAR}|.+?{stop})", re.IGNORECASE)
+        self.ops = [(re.compile(rf"^(?:{pattern})$", re.IGNORECASE), op) for pattern, op in OPERATORS]
+
+    @staticmethod
+    def normalize(name):
+        return re.sub(r"[_\s]+", " ", name).strip().lower()
+
+    def canonical_op(self, text):
+        for pattern, op in self.ops:
+            if pattern.match(text.strip()):
+                return op
+        return "="
+
+    # known(column, text): whether text is a value of the column; unquoted
+    # free text that is not ("which unit is largest") is not a filter
+    def parse(self, query, known=None):
+        filters = []
+        taken = []
+        for m in self.range_pattern.finditer(query):
+            column = self.columns.get(self.normalize(m.group("column")))
+            if column:
+                filters.append((column, "between", (parse_value(m.group("low")), parse_value(m.group("high")))))
+                taken.append(m.span())
+        for m in self.pattern.finditer(query):
+            if any(start <= m.start() < end for start, end in taken):
+                continue
+            column = self.columns.get(self.normalize(m.group("column")))
+            value = parse_value(m.group("value"))
+            if column and known is not None and is_free_text(m.group("value"), value):
+                value = known_prefix(column, value, known) or ""
+            if column and value != "":
+                filters.append((column, self.canonical_op(m.group("op")), value))
+        return filters
+
+@lru_cache(maxsize=16)
+def parser_for(columns):
+    return QueryParser(columns)
+
+def extract_filters(query, columns, known=None):
+    if not columns:
+        return []
+    return parser_for(tuple(columns)).parse(query, known)
@@ -0,0 +1,87 @@
+import os
+import re
+import time
+import threading
+import numpy as np
+from lexical_index import tokenize, query_tokens, rrf
+
+# rows of a CSV collection put in the prompt, out of the TOP_K retrieved
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "10"))
+# optional CPU cross-encoder, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2;
+# without one the retrieval order is fused with keyword coverage
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+# columns that differ on every row without saying anything about it
+IDENTIFIER = re.compile(r"(?:^|[_\s])(?:id|uid|uuid|key)$", re.IGNORECASE)
+
+def row_text(row):
+    return ", ".join(f"{k}: {v}" for k, v in row.items())
+
+# indices of the first occurrence of each row, ignoring identifier columns
+def dedupe(rows):
+    seen, keep = set(), []
+    for i, row in enumerate(rows):
+        key = tuple((k, str(v)) for k, v in row.items() if not IDENTIFIER.search(str(k)))
+        if key not in seen:
+            seen.add(key)
+            keep.append(i)
+    return keep
+
+# share of the question's words found among a row's values
+def coverage(query, rows):
+    tokens = set(query_tokens(query))
+    if not tokens:
+        return np.zeros(len(rows))
+    return np.array([len(tokens.intersection(tokenize(" ".join(str(v) for v in row.values())))) / len(tokens)
+                     for row in rows])
+
+class Reranker:
+    def __init__(self, model_name=RERANK_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self.failed = False
+        self.load_lock = threading.Lock()
+        self.calls = 0
+        self.candidates = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+
+    def model(self):
+        if not self.model_name or self.failed:
+            return None
+        if self._model is None:
+            with self.load_lock:
+                if self._model is None and not self.failed:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                        self._model = CrossEncoder(self.model_name, device="cpu")
+                    except Exception as e:
+                        print(f"Cross-encoder {self.model_name} unavailable ({e}); fusing scores instead")
+                        self.failed = True
+        return self._model
+
+    # rows in retrieval order -> indices of the k best distinct rows, best first
+    def rerank(self, query, rows, k=CONTEXT_TOP_K):
+        start = time.perf_counter()
+        keep = dedupe(rows)
+        model = self.model()
+        if model is not None and len(keep) > 1:
+            scores = np.asarray(model.predict([(query, row_text(rows[i])) for i in keep]))
+            order = np.argsort(-scores, kind="stable")
+        else:
+            by_coverage = np.argsort(-coverage(query, [rows[i] for i in keep]), kind="stable")
+            _, order = rrf([np.arange(len(keep)), by_coverage], len(keep))
+        self.calls += 1
+        self.candidates += len(rows)
+        self.duplicates += len(rows) - len(keep)
+        self.seconds += time.perf_counter() - start
+        return [keep[i] for i in order[:k]]
+
+    def stats(self):
+        return {
+            "backend": "cross-encoder" if self._model is not None else "fusion",
+            "model": self.model_name or None,
+            "calls": self.calls,
+            "candidates": self.candidates,
+            "duplicates_dropped": self.duplicates,
+            "mean_seconds": round(self.seconds / self.calls, 6) if self.calls else 0.0,
+        }
@@ -0,0 +1,117 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# cosine similarity above which two questions over the same context share an
+# answer; 0 keeps the cache to exact (normalized) matches only
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+def normalize_question(question):
+    question = re.sub(r"[^\w\s-]", " ", question.lower())
+    return re.sub(r"\s+", " ", question).strip()
+
+def context_hash(context):
+    return hashlib.sha1(context.encode("utf-8")).hexdigest()
+
+class Entry:
+    def __init__(self, namespace, ctx, value, vector, expires):
+        self.namespace = namespace
+        self.ctx = ctx
+        self.value = value
+        self.vector = vector
+        self.expires = expires
+
+# LRU + TTL cache of LLM answers keyed by (namespace, prompt context hash,
+# normalized question). With a similarity threshold, a miss falls back to the
+# closest earlier question asked over the same context.
+class ResponseCache:
+    def __init__(self, embed=None, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 similarity=RESPONSE_CACHE_SIMILARITY):
+        self.embed = embed
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity if embed else 0
+        self.entries = OrderedDict()
+        self.by_context = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def question_vector(self, question):
+        if not self.similarity:
+            return None
+        return np.asarray(self.embed([question])[0], dtype="float32")
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        keys = self.by_context.get((entry.namespace, entry.ctx))
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.by_context[(entry.namespace, entry.ctx)]
+
+    def get(self, namespace, context, question):
+        ctx, q = context_hash(context), normalize_question(question)
+        key = (namespace, ctx, q)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry.expires < now:
+                self.remove(key)
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            candidates = list(self.by_context.get((namespace, ctx), ()))
+        if candidates and self.similarity:
+            vector = self.question_vector(q)
+            with self.lock:
+                best, best_score = None, self.similarity
+                for k in candidates:
+                    e = self.entries.get(k)
+                    if e is None or e.expires < now:
+                        continue
+                    score = float(np.dot(vector, e.vector))
+                    if score >= best_score:
+                        best, best_score = k, score
+                if best:
+                    self.entries.move_to_end(best)
+                    self.semantic_hits += 1
+                    return self.entries[best].value
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, namespace, context, question, value):
+        ctx, q = context_hash(context), normalize_question(question)
+        key = (namespace, ctx, q)
+        vector = self.question_vector(q)
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = Entry(namespace, ctx, value, vector, time.time() + self.ttl)
+            self.by_context.setdefault((namespace, ctx), set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+
+    def invalidate(self, namespace=None):
+        with self.lock:
+            for key in [k for k in self.entries if namespace is None or k[0] == namespace]:
+                self.remove(key)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
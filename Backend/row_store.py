@@ -0,0 +1,224 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Columnar row store. Every column lives in its own flat binary file that is
+# memory-mapped on open, so nothing is deserialized until a row is fetched:
+#   numeric columns -> <i>.values  (float64, NaN = missing)
+#   text columns    -> <i>.codes   (int32 code, -1 = missing)
+#                      <i>.strings (utf-8 bytes of the distinct values)
+#                      <i>.offsets (int64 start of each value in .strings)
+
+SCHEMA_FILE = "schema.json"
+
+def column_kind(series):
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_numeric_dtype(series):
+        return "float"
+    return "str"
+
+def is_text(col):
+    return col["kind"] == "str"
+
+def render(kind, value):
+    if kind == "int":
+        return int(value)
+    if kind == "bool":
+        return bool(value)
+    return float(value)
+
+# how a stored number reads once its column has become text
+def number_text(kind, value):
+    value = render(kind, value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class RowStoreWriter:
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = []
+        self.files = {}
+        self.lookup = {}
+        self.string_bytes = {}
+        self.rows = 0
+
+    def file(self, i, suffix):
+        key = (i, suffix)
+        if key not in self.files:
+            self.files[key] = open(os.path.join(self.path, f"{i}.{suffix}"), "ab")
+        return self.files[key]
+
+    def add_column(self, name, kind):
+        i = len(self.columns)
+        self.columns.append({"name": name, "kind": kind})
+        if kind == "str":
+            self.lookup[i] = {}
+            self.string_bytes[i] = 0
+            self.file(i, "offsets").write(np.zeros(1, dtype="int64").tobytes())
+        # rows written before this column existed are missing a value
+        self.write_column(i, None, self.rows)
+
+    def write_column(self, i, series, n):
+        col = self.columns[i]
+        if is_text(col):
+            self.file(i, "codes").write(self.encode(i, series, n).tobytes())
+            return
+        if series is None:
+            values = np.full(n, np.nan)
+        else:
+            values = pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            if (series.notna().to_numpy() & np.isnan(values)).any():
+                self.promote_to_text(i)
+                self.file(i, "codes").write(self.encode(i, series, n).tobytes())
+                return
+            finite = values[np.isfinite(values)]
+            if col["kind"] == "bool" and column_kind(series) != "bool":
+                col["kind"] = "int"
+            if col["kind"] == "int" and not np.array_equal(finite, np.round(finite)):
+                col["kind"] = "float"
+        self.file(i, "values").write(values.tobytes())
+
+    # the kind comes from the first chunk; when a later chunk holds text in a
+    # numeric column, the values written so far are rewritten as text
+    def promote_to_text(self, i):
+        col = self.columns[i]
+        handle = self.files.pop((i, "values"), None)
+        if handle is not None:
+            handle.close()
+        path = os.path.join(self.path, f"{i}.values")
+        values = np.fromfile(path, dtype="float64") if os.path.exists(path) else np.zeros(0)
+        if os.path.exists(path):
+            os.remove(path)
+        old = pd.Series([None if np.isnan(v) else number_text(col["kind"], v) for v in values], dtype=object)
+        col["kind"] = "str"
+        self.lookup[i] = {}
+        self.string_bytes[i] = 0
+        self.file(i, "offsets").write(np.zeros(1, dtype="int64").tobytes())
+        self.file(i, "codes").write(self.encode(i, old, len(old)).tobytes())
+
+    def encode(self, i, series, n):
+        codes = np.full(n, -1, dtype="int32")
+        if series is None:
+            return codes
+        present = series.notna().to_numpy()
+        local, uniques = pd.factorize(series[present].astype(str))
+        lookup = self.lookup[i]
+        mapping = np.empty(len(uniques), dtype="int32")
+        new_offsets = []
+        for j, value in enumerate(uniques):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+                data = value.encode("utf-8")
+                self.file(i, "strings").write(data)
+                self.string_bytes[i] += len(data)
+                new_offsets.append(self.string_bytes[i])
+            mapping[j] = code
+        if new_offsets:
+            self.file(i, "offsets").write(np.array(new_offsets, dtype="int64").tobytes())
+        codes[present] = mapping[local]
+        return codes
+
+    def append(self, df):
+        names = [c["name"] for c in self.columns]
+        for name in df.columns:
+            if name not in names:
+                self.add_column(name, column_kind(df[name]))
+        for i, col in enumerate(self.columns):
+            self.write_column(i, df[col["name"]] if col["name"] in df else None, len(df))
+        self.rows += len(df)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        tmp = os.path.join(self.path, SCHEMA_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"columns": self.columns, "rows": self.rows}, f)
+        os.replace(tmp, os.path.join(self.path, SCHEMA_FILE))
+
+class RowStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE), "r") as f:
+            schema = json.load(f)
+        self.columns = schema["columns"]
+        self.rows = schema["rows"]
+        self.positions = {c["name"]: i for i, c in enumerate(self.columns)}
+        self.maps = {}
+
+    def __len__(self):
+        return self.rows
+
+    def array(self, i, suffix, dtype):
+        key = (i, suffix)
+        if key not in self.maps:
+            path = os.path.join(self.path, f"{i}.{suffix}")
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                self.maps[key] = np.zeros(0, dtype=dtype)
+            else:
+                self.maps[key] = np.memmap(path, dtype=dtype, mode="r")
+        return self.maps[key]
+
+    def string(self, i, code):
+        offsets = self.array(i, "offsets", "int64")
+        data = self.array(i, "strings", "uint8")
+        return bytes(data[offsets[code]:offsets[code + 1]]).decode("utf-8")
+
+    def strings(self, i):
+        offsets = self.array(i, "offsets", "int64")
+        data = bytes(self.array(i, "strings", "uint8"))
+        return [data[offsets[c]:offsets[c + 1]].decode("utf-8") for c in range(len(offsets) - 1)]
+
+    def render(self, i, value):
+        return render(self.columns[i]["kind"], value)
+
+    def value(self, i, row):
+        if is_text(self.columns[i]):
+            code = self.array(i, "codes", "int32")[row]
+            return None if code < 0 else self.string(i, code)
+        value = self.array(i, "values", "float64")[row]
+        return None if np.isnan(value) else self.render(i, value)
+
+    def row(self, row):
+        out = {}
+        for i, col in enumerate(self.columns):
+            value = self.value(i, row)
+            if value is not None:
+                out[col["name"]] = value
+        return out
+
+    def column(self, name):
+        i = self.positions[name]
+        if is_text(self.columns[i]):
+            return self.array(i, "codes", "int32")
+        return self.array(i, "values", "float64")
+
+    def frame(self):
+        data = {}
+        for i, col in enumerate(self.columns):
+            if is_text(col):
+                codes = np.asarray(self.array(i, "codes", "int32"))
+                values = np.array(self.strings(i) + [None], dtype=object)
+                data[col["name"]] = values[codes]
+            else:
+                values = pd.Series(np.asarray(self.array(i, "values", "float64")))
+                # nullable dtypes keep the column kind when the store is rewritten
+                if col["kind"] == "int":
+                    values = values.astype("Int64")
+                elif col["kind"] == "bool":
+                    values = values.astype("boolean")
+                data[col["name"]] = values.to_numpy() if col["kind"] == "float" else values.array
+        return pd.DataFrame(data)
+
+def write_rows(path, df):
+    writer = RowStoreWriter(path)
+    writer.append(df)
+    writer.close()
+    return RowStore(path)
@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+import mysql.connector
+
+# how long the catalog is served without asking MySQL whether anything changed
+SCHEMA_CHECK_INTERVAL = float(os.getenv("SCHEMA_CHECK_INTERVAL", "30"))
+# columns of every table are reloaded at least this often, since some ALTERs
+# leave UPDATE_TIME/CREATE_TIME untouched
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "600"))
+
+NUMERIC_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint",
+                 "decimal", "numeric", "float", "double", "real"}
+TEMPORAL_TYPES = {"date", "datetime", "timestamp", "time", "year"}
+
+def column_kind(data_type):
+    if data_type in NUMERIC_TYPES:
+        return "number"
+    if data_type in TEMPORAL_TYPES:
+        return "date"
+    return "text"
+
+# Table list, column types, primary keys and row estimates read from
+# INFORMATION_SCHEMA. After SCHEMA_CHECK_INTERVAL a single TABLES query decides
+# which tables changed (UPDATE_TIME/CREATE_TIME) and only those are re-read.
+class SchemaCatalog:
+    def __init__(self, connect, check_interval=SCHEMA_CHECK_INTERVAL, ttl=SCHEMA_CACHE_TTL):
+        self.connect = connect
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.checked_at = 0
+        self.loaded_at = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.tables = {}
+            self.checked_at = 0
+            self.loaded_at = 0
+
+    def read_tables(self, cur):
+        cur.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS, UPDATE_TIME, CREATE_TIME FROM INFORMATION_SCHEMA.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
+        )
+        return {name: (rows, str(updated) if updated else None, str(created) if created else None)
+                for name, rows, updated, created in cur.fetchall()}
+
+    def read_columns(self, cur, names):
+        columns = {name: [] for name in names}
+        cur.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY "
+            "FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+            f"AND TABLE_NAME IN ({', '.join(['%s'] * len(names))}) "
+            "ORDER BY TABLE_NAME, ORDINAL_POSITION",
+            tuple(names),
+        )
+        for table, name, data_type, column_type, nullable, key in cur.fetchall():
+            if table in columns:
+                columns[table].append({
+                    "name": name,
+                    "type": column_type,
+                    "kind": column_kind(data_type.lower()),
+                    "nullable": nullable == "YES",
+                    "primary_key": key == "PRI",
+                })
+        return columns
+
+    def refresh(self, force=False, full=False):
+        now = time.time()
+        with self.lock:
+            if not force and now - self.checked_at < self.check_interval:
+                return
+            conn = self.connect()
+            if not conn:
+                raise mysql.connector.Error("DB connect error")
+            with conn:
+                cur = conn.cursor()
+                current = self.read_tables(cur)
+                full = full or now - self.loaded_at >= self.ttl
+                changed = [name for name, (_, updated, created) in current.items()
+                           if full or name not in self.tables
+                           or (self.tables[name]["update_time"], self.tables[name]["create_time"]) != (updated, created)]
+                columns = self.read_columns(cur, changed) if changed else {}
+                cur.close()
+            tables = {}
+            for name, (rows, updated, created) in current.items():
+                cols = columns[name] if name in columns else self.tables[name]["columns"]
+                tables[name] = {
+                    "columns": cols,
+                    "primary_key": [c["name"] for c in cols if c["primary_key"]],
+                    "rows_estimate": rows,
+                    "update_time": updated,
+                    "create_time": created,
+                }
+            self.tables = tables
+            self.checked_at = now
+            if full:
+                self.loaded_at = now
+
+    def snapshot(self, force=False):
+        self.refresh(force, full=force)
+        return {"tables": self.tables, "checked_at": self.checked_at}
+
+    def table_names(self):
+        self.refresh()
+        return list(self.tables)
+
+    def table(self, name):
+        self.refresh()
+        if name not in self.tables:
+            # created since the last check
+            self.refresh(force=True)
+        return self.tables.get(name)
+
+    def column_kinds(self, name):
+        info = self.table(name) if name else None
+        return {c["name"]: c["kind"] for c in info["columns"]} if info else {}
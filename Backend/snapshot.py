@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import time
+import zlib
+
+# Every change to a store's segment list is written as a new numbered
+# snapshot under <folder>/snapshots, listing each segment's row count and
+# the size and crc32 of each of its files; segments.json is a copy of the
+# newest one. Files are fsynced before the snapshot naming them, and each
+# json file is written to a temporary name and renamed, so after a crash the
+# newest snapshot is either complete or absent. On load a snapshot that
+# fails its checks is set aside and the previous one is used.
+
+# snapshots kept for rolling back; files of segments none of them lists are deleted
+SNAPSHOT_KEEP = max(1, int(os.getenv("SNAPSHOT_KEEP", "3")))
+# "quick" checksums files up to CHECKSUM_MAX_BYTES on load and only checks the
+# size of larger ones, so restarts do not read whole indexes; "full" checksums everything
+SNAPSHOT_VERIFY = os.getenv("SNAPSHOT_VERIFY", "quick").lower()
+CHECKSUM_MAX_BYTES = int(os.getenv("SNAPSHOT_CHECKSUM_MAX_BYTES", str(64 * 1024 * 1024)))
+VERSION_FILE = re.compile(r"^v(\d{6})\.json$")
+CHUNK = 1 << 20
+
+class SnapshotError(Exception):
+    pass
+
+def fsync_dir(path):
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(path))
+
+def checksum(path):
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+    return f"{crc:08x}"
+
+# the files under each path (a file or a directory), relative to root
+def files_under(root, paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                found += [os.path.join(folder, n) for n in names if not n.endswith(".tmp")]
+        elif os.path.exists(path):
+            found.append(path)
+    return sorted(os.path.relpath(p, root) for p in found)
+
+# {relative path: {"size", "crc32"}} of the files, flushed to disk first
+def describe(root, paths):
+    files = {}
+    for rel in files_under(root, paths):
+        path = os.path.join(root, rel)
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+        files[rel] = {"size": os.path.getsize(path), "crc32": checksum(path)}
+    for folder in {os.path.dirname(os.path.join(root, rel)) for rel in files}:
+        fsync_dir(folder)
+    return files
+
+def verify_files(root, files):
+    for rel, expected in files.items():
+        path = os.path.join(root, rel)
+        if not os.path.exists(path):
+            raise SnapshotError(f"{rel} is missing")
+        size = os.path.getsize(path)
+        if size != expected["size"]:
+            raise SnapshotError(f"{rel} has {size} bytes, expected {expected['size']}")
+        if SNAPSHOT_VERIFY == "full" or size <= CHECKSUM_MAX_BYTES:
+            if checksum(path) != expected["crc32"]:
+                raise SnapshotError(f"{rel} does not match its checksum")
+
+class SnapshotManager:
+    def __init__(self, folder, current_path, keep=SNAPSHOT_KEEP):
+        self.folder = os.path.join(folder, "snapshots")
+        self.current_path = current_path
+        self.keep = keep
+        self.version = 0
+        self.rollbacks = 0
+        self.loaded_seconds = 0.0
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, version):
+        return os.path.join(self.folder, f"v{version:06d}.json")
+
+    def versions(self):
+        found = (VERSION_FILE.match(n) for n in os.listdir(self.folder))
+        return sorted((int(m.group(1)) for m in found if m), reverse=True)
+
+    def read(self, path):
+        with open(path, "r") as f:
+            return json.load(f)
+
+    # the numbered snapshots, newest first; a segments.json from before
+    # snapshots existed has no version and is the only candidate
+    def candidates(self):
+        versions = self.versions()
+        if not versions:
+            if os.path.exists(self.current_path):
+                yield self.read(self.current_path)
+            return
+        for version in versions:
+            try:
+                yield self.read(self.path(version))
+            except (OSError, ValueError) as e:
+                print(f"Snapshot {self.path(version)} is unreadable ({e})")
+
+    # entries: [{"name", "rows", "files"}] in segment order
+    def commit(self, entries, next_id):
+        version = max(self.versions()[:1] + [self.version]) + 1
+        snapshot = {"version": version, "created_at": time.time(), "next_id": next_id, "segments": entries}
+        write_json(self.path(version), snapshot)
+        write_json(self.current_path, snapshot)
+        self.version = version
+        for old in self.versions()[self.keep:]:
+            os.remove(self.path(old))
+        return snapshot
+
+    # makes an older snapshot current after the newer ones failed to load;
+    # the failed ones are renamed so they are neither retried nor deleted
+    def roll_back(self, snapshot):
+        for version in self.versions():
+            if version > snapshot["version"]:
+                os.replace(self.path(version), self.path(version) + ".broken")
+        write_json(self.current_path, snapshot)
+        self.version = snapshot["version"]
+        self.rollbacks += 1
+
+    # segment names listed by any kept snapshot
+    def referenced(self):
+        names = set()
+        for version in self.versions():
+            try:
+                names.update(s["name"] for s in self.read(self.path(version))["segments"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return names
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "versions": self.versions(),
+            "rollbacks": self.rollbacks,
+            "load_seconds": round(self.loaded_seconds, 3),
+            "verify": SNAPSHOT_VERIFY,
+        }
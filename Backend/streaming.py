@@ -0,0 +1,46 @@
+import re
+import json
+
+LIST_MARKER = re.compile(r"(\d+\.)\s*")
+# a tail that may still grow into a list marker once more tokens arrive
+OPEN_TAIL = re.compile(r"\d+\.?\s*$")
+MARKER_END = re.compile(r"\d+\.$")
+
+# puts each "<n>." list marker on its own line
+def format_text(txt):
+    return LIST_MARKER.sub(r"\n\1 ", txt).strip()
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Applies format_text to a token stream: text is released as soon as it can
+# no longer be part of a "<n>." list marker, so the concatenated output is
+# the same as format_text on the full answer.
+class StreamFormatter:
+    def __init__(self):
+        self.pending = ""
+        self.started = False
+
+    def emit(self, text):
+        text = LIST_MARKER.sub(r"\n\1 ", text)
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        return text
+
+    def feed(self, chunk):
+        self.pending += chunk
+        tail = OPEN_TAIL.search(self.pending)
+        cut = tail.start() if tail else len(self.pending)
+        ready, self.pending = self.pending[:cut], self.pending[cut:]
+        # trailing whitespace is held back so the final strip() can drop it,
+        # unless it follows a marker: a marker is only released once the text
+        # after its whitespace has arrived, and it replaces that whitespace
+        stripped = ready.rstrip()
+        if not MARKER_END.search(stripped):
+            self.pending = ready[len(stripped):] + self.pending
+        return self.emit(stripped)
+
+    def flush(self):
+        text, self.pending = self.pending, ""
+        return self.emit(text).rstrip()
@@ -0,0 +1,49 @@
+import aggregate_router
+
+DIMS = {
+    "business_date": {"date": True, "values": {"2025-02-06", "2025-02-14", "2025-03-01"}},
+    "business_unit": {"date": False, "values": {"BRI", "SME", "Unit K"}},
+    "partner_name": {"date": False, "values": {"Partner A", "Partner B", "Partner C"}},
+    "customer_flagged": {"date": False, "values": ["False", "True"]},
+}
+MEASURES = ["total_balance", "no_of_customers"]
+
+def parse(question):
+    return aggregate_router.parse(question, DIMS, MEASURES)
+
+def test_filters_and_day():
+    intent = parse("How many customers does Unit K have on 2025-02-14?")
+    assert intent["measure"] == "no_of_customers"
+    assert intent["filters"] == {"business_unit": ["Unit K"], "business_date": ["2025-02-14"]}
+
+def test_ranked_group():
+    intent = parse("Which partner has the highest balance?")
+    assert intent["group_by"] == ["partner_name"] and intent["rank"] == "max"
+
+def test_month_or_year_is_not_answered():
+    assert parse("What was the total balance in February 2025?") is None
+    assert parse("Total balance last month") is None
+    assert parse("Total balance on February 14, 2025") is not None
+
+def test_comparison_is_not_answered():
+    assert parse("Is the total balance of Partner A higher than Partner C?") is None
+
+def test_flag_condition_is_not_answered():
+    assert parse("Total balance for customers flagged") is None
+    assert parse("Total balance by customer flagged")["group_by"] == ["customer_flagged"]
+
+def test_plural_and_singular_measure_words():
+    intent = parse("sum of balances by business_unit")
+    assert intent["measure"] == "total_balance" and intent["group_by"] == ["business_unit"]
+    assert parse("Average customer per partner")["measure"] == "no_of_customers"
+
+def test_inflect():
+    assert [aggregate_router.inflect(w) for w in ["balance", "balances", "business unit", "category",
+                                                  "categories", "class", "classes"]] == \
+        ["balances", "balance", "business units", "categories", "category", "classes", "class"]
+
+def test_describe_uses_readable_measure_name():
+    intent = {"op": "sum", "measure": "total_balance", "filters": {}, "dates": []}
+    assert aggregate_router.describe(intent) == "Total balance"
+    intent.update(op="mean", measure="no_of_customers")
+    assert aggregate_router.describe(intent) == "Average no of customers"
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from csv_collections import CollectionManager
+
+DIMENSION = 4
+
+def add_rows(writer, df):
+    writer.add(np.zeros((len(df), DIMENSION), dtype="float32"), df)
+    return writer.commit()
+
+def test_store_with_queued_upload_stays_open(tmp_path):
+    collections = CollectionManager(str(tmp_path), DIMENSION, max_loaded=1)
+    store, writer = collections.open_writer("first")
+    collections.get("second", create=True)
+    add_rows(writer, pd.DataFrame({"unit": ["A", "B"]}))
+    collections.refresh("first", store)
+    assert collections.get("first") is store
+    assert len(collections.get("first")) == 2
+
+def test_route_by_aliases_and_values(tmp_path):
+    collections = CollectionManager(str(tmp_path), DIMENSION)
+    collections.catalog = {
+        "balance_data": {"columns": ["business_date", "business_unit", "no_of_customers", "total_balance"],
+                         "values": ["BRI", "Unit K"], "rows": 10, "updated_at": 1},
+        "daily_data": {"columns": ["business_date", "business_unit", "total_unique_customers"],
+                       "values": ["SME"], "rows": 10, "updated_at": 2},
+    }
+    assert collections.route("How many customers does Unit K have on 2025-02-14?") == "balance_data"
+    assert collections.route("What about SME?") == "daily_data"
+
+class OpenStore:
+    def __init__(self, distance):
+        self.distance = distance
+
+def test_route_without_matches_uses_distance_of_open_stores(tmp_path):
+    collections = CollectionManager(str(tmp_path), DIMENSION)
+    collections.catalog = {
+        "a": {"columns": ["x"], "values": [], "rows": 1, "updated_at": 2},
+        "b": {"columns": ["y"], "values": [], "rows": 1, "updated_at": 1},
+        "c": {"columns": ["z"], "values": [], "rows": 1, "updated_at": 3},
+    }
+    distance = lambda store: store.distance
+    assert collections.route("something else", distance) == "c"
+    collections.loaded.update(a=OpenStore(5.0), b=OpenStore(1.0))
+    assert collections.route("something else", distance) == "b"
+    assert set(collections.loaded) == {"a", "b"}
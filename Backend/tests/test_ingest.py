@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import ingest
+from csv_store import CSVStore
+
+DIMENSION = 8
+
+def encode(docs):
+    return np.random.default_rng(len(docs)).random((len(docs), DIMENSION), dtype="float32")
+
+def upload(tmp_path, df):
+    path = tmp_path / "upload.csv"
+    df.to_csv(path, index=False)
+    store = CSVStore(str(tmp_path / "store"), DIMENSION)
+    store.load()
+    job = ingest.IngestJob("upload.csv", str(path))
+    ingest.run(job, store, store.open_segment(), encode)
+    return job, store
+
+def test_rows_to_text_matches_row_text():
+    df = pd.DataFrame({"a": [1.0, np.nan], "b": ["x", None], "c": [True, None]})
+    expected = [", ".join(f"{k}: {v}" for k, v in row.items()) for row in df.to_dict(orient="records")]
+    assert ingest.rows_to_text(df) == expected
+
+def test_upload_with_missing_values(tmp_path):
+    df = pd.DataFrame({"unit": [f"U{i}" for i in range(10)], "balance": [float(i) for i in range(10)]})
+    df.loc[3, "balance"] = np.nan
+    df.loc[5, "unit"] = None
+    job, store = upload(tmp_path, df)
+    assert job.status == "done", job.error
+    assert len(store) == 10
+    assert store.row(3)["unit"] == "U3"
+
+def test_column_turning_to_text_keeps_every_value(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "CHUNK_ROWS", 5)
+    df = pd.DataFrame({"note": [None] * 5 + [f"hello {i}" for i in range(5, 10)],
+                       "code": list(range(5)) + [f"A{i}" for i in range(5, 10)],
+                       "balance": [1.5 * i for i in range(10)]})
+    job, store = upload(tmp_path, df)
+    assert job.status == "done", job.error
+    rows = [store.row(i) for i in range(10)]
+    assert [r.get("note") for r in rows] == [None] * 5 + [f"hello {i}" for i in range(5, 10)]
+    assert [r["code"] for r in rows] == [str(i) for i in range(5)] + [f"A{i}" for i in range(5, 10)]
+    assert rows[4]["balance"] == 6.0
+
+def test_failing_on_done_keeps_the_segment(tmp_path):
+    path = tmp_path / "upload.csv"
+    pd.DataFrame({"unit": ["A", "B"]}).to_csv(path, index=False)
+    store = CSVStore(str(tmp_path / "store"), DIMENSION)
+    store.load()
+
+    def on_done():
+        raise OSError("catalog not writable")
+
+    job = ingest.IngestJob("upload.csv", str(path))
+    ingest.run(job, store, store.open_segment(), encode, on_done)
+    assert job.status == "done" and "catalog not writable" in job.warning
+    assert len(store) == 2
+    reopened = CSVStore(str(tmp_path / "store"), DIMENSION)
+    reopened.load()
+    assert len(reopened) == 2
+
+def test_upload_file_is_removed(tmp_path):
+    job, _ = upload(tmp_path, pd.DataFrame({"unit": ["A"]}))
+    assert job.status == "done"
+    assert not (tmp_path / "upload.csv").exists()
+
+def test_upload_file_is_removed_when_the_job_fails(tmp_path):
+    path = tmp_path / "upload.csv"
+    pd.DataFrame({"unit": ["A"]}).to_csv(path, index=False)
+    store = CSVStore(str(tmp_path / "store"), DIMENSION)
+    store.load()
+
+    def broken(docs):
+        raise RuntimeError("embedder down")
+
+    job = ingest.IngestJob("upload.csv", str(path))
+    ingest.run(job, store, store.open_segment(), broken)
+    assert job.status == "failed"
+    assert not path.exists()
@@ -0,0 +1,76 @@
+import json
+import sqlite3
+import pytest
+import mysql_browse
+
+INFO = {"columns": [{"name": "id"}, {"name": "score"}], "primary_key": ["id"]}
+SCORES = [3, None, 1, None, 3, 2, None, 1]
+
+# SQLite sorts NULLs like MySQL (first ascending, last descending) and
+# supports row values, so pages can be checked against it
+def table():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, score INTEGER)")
+    db.executemany("INSERT INTO t VALUES (?, ?)", list(enumerate(SCORES, 1)))
+    return db
+
+def browse_all(db, sort, limit):
+    ids, after = [], None
+    for _ in range(len(SCORES) + 1):
+        page = mysql_browse.prepare(INFO, "t", limit, after, sort=sort)
+        rows = db.execute(page.sql.replace("`", '"').replace("%s", "?"), page.params).fetchall()
+        ids += [r[0] for r in rows]
+        if len(rows) < limit:
+            break
+        after = mysql_browse.encode_cursor({"n": len(ids), "k": [rows[-1][1], rows[-1][0]]})
+    return ids
+
+@pytest.mark.parametrize("sort", ["score", "-score"])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_nullable_sort_column_returns_every_row(sort, limit):
+    db = table()
+    order = "DESC" if sort.startswith("-") else ""
+    expected = [r[0] for r in db.execute(f"SELECT id FROM t ORDER BY score {order}, id {order}")]
+    assert browse_all(db, sort, limit) == expected
+
+class Cursor:
+    def __init__(self, rows, error=None):
+        self.rows, self.error, self.closed = rows, error, False
+
+    def execute(self, sql, params):
+        if self.error:
+            raise self.error
+
+    def fetchmany(self, n):
+        batch, self.rows = self.rows[:n], self.rows[n:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+class Connection:
+    def __init__(self, cursor):
+        self.cur, self.closed = cursor, False
+
+    def cursor(self, **kwargs):
+        return self.cur
+
+    def close(self):
+        self.closed = True
+
+def test_failing_query_raises_before_streaming():
+    conn = Connection(Cursor([], RuntimeError("gone away")))
+    page = mysql_browse.prepare(INFO, "t", 2)
+    with pytest.raises(RuntimeError):
+        mysql_browse.start(conn, page)
+    assert conn.closed and conn.cur.closed
+
+def test_stream_returns_every_batch(monkeypatch):
+    monkeypatch.setattr(mysql_browse, "FETCH_BATCH", 2)
+    rows = [{"id": i, "score": s} for i, s in enumerate(SCORES, 1)]
+    conn = Connection(Cursor(list(rows)))
+    page = mysql_browse.prepare(INFO, "t", len(rows))
+    body = json.loads(b"".join(mysql_browse.start(conn, page)))
+    assert body["rows"] == rows
+    assert mysql_browse.decode_cursor(body["next_cursor"]) == {"n": 8, "k": [8]}
+    assert conn.closed
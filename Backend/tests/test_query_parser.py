@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from csv_store import CSVStore
+from query_parser import extract_filters, parse_value
+
+COLUMNS = ("business_unit", "partner_name", "total_balance", "no_of_customers")
+
+def store_with_rows(tmp_path):
+    store = CSVStore(str(tmp_path), 4)
+    store.load()
+    writer = store.open_segment()
+    df = pd.DataFrame({"business_unit": ["BRI", "SME", "Unit K"], "partner_name": ["Partner A", "Partner C", "Partner A"],
+                       "total_balance": [1.5e9, 2e8, 7e9], "no_of_customers": [10, 20, 30]})
+    writer.add(np.zeros((3, 4), dtype="float32"), df)
+    writer.commit()
+    return store
+
+def test_question_words_are_not_values(tmp_path):
+    store = store_with_rows(tmp_path)
+    assert extract_filters("Which business_unit is largest?", COLUMNS, store.knows) == []
+    assert extract_filters("Which business unit is the biggest by total balance?", COLUMNS, store.knows) == []
+
+def test_known_values_are_kept(tmp_path):
+    store = store_with_rows(tmp_path)
+    assert extract_filters("partner name is Partner C", COLUMNS, store.knows) == [("partner_name", "=", "Partner C")]
+    assert extract_filters("business_unit: BRI with the highest balance", COLUMNS, store.knows) == [
+        ("business_unit", "=", "BRI")]
+    assert extract_filters("partner_name = 'Partner Z'", COLUMNS, store.knows) == [("partner_name", "=", "Partner Z")]
+
+def test_numbers_with_units():
+    assert extract_filters("total_balance over 1 billion", COLUMNS) == [("total_balance", ">", 1_000_000_000)]
+    assert extract_filters("total balance < 2.5 juta", COLUMNS) == [("total_balance", "<", 2_500_000)]
+    assert parse_value("500k") == 500_000
+    assert parse_value("1,000") == 1000
+    assert parse_value("3.5") == 3.5
@@ -0,0 +1,22 @@
+import random
+from streaming import StreamFormatter, format_text
+
+PIECES = ["1", "2", "10", ".", ". ", " ", "  ", "\n", "a", "item", "3.5"]
+
+def stream(chunks):
+    formatter = StreamFormatter()
+    return "".join(formatter.feed(c) for c in chunks) + formatter.flush()
+
+def random_chunks(rng, text):
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 6)))) if len(text) > 1 else []
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+def test_marker_split_from_its_space():
+    assert stream(["1.", " 1"]) == format_text("1. 1")
+
+def test_random_chunkings_match_format_text():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 12)))
+        chunks = random_chunks(rng, text)
+        assert stream(chunks) == format_text(text), chunks
@@ -0,0 +1,79 @@
+import pytest
+import text_to_sql
+from text_to_sql import UnsafeSQL, validate
+
+TABLES = {"balance_data": {}, "daily_data": {}}
+
+def test_select_gets_a_limit():
+    assert validate("SELECT * FROM balance_data", TABLES).endswith(f"LIMIT {text_to_sql.SQL_ROW_LIMIT + 1}")
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM balance_data, mysql.user",
+    "SELECT * FROM balance_data b, `mysql`.`user` u",
+    "SELECT * FROM balance_data JOIN mysql.user ON 1 = 1",
+    "SELECT * FROM (SELECT * FROM information_schema.tables) t",
+    "SELECT * FROM balance_data WHERE id IN (SELECT id FROM daily_data, secrets)",
+    "SELECT * FROM balance_data; DROP TABLE balance_data",
+    "DELETE FROM balance_data",
+    "SELECT * FROM balance_data INTO OUTFILE '/tmp/x'",
+])
+def test_rejected(sql):
+    with pytest.raises(UnsafeSQL):
+        validate(sql, TABLES)
+
+@pytest.mark.parametrize("sql", [
+    "SELECT business_unit, SUM(total_balance) FROM balance_data GROUP BY business_unit",
+    "SELECT * FROM balance_data b, daily_data d WHERE b.business_unit = d.business_unit",
+    "SELECT EXTRACT(YEAR FROM business_date) y, COUNT(*) FROM balance_data GROUP BY y",
+    "WITH t AS (SELECT * FROM balance_data) SELECT * FROM t LEFT JOIN daily_data USING (business_unit)",
+    "SELECT * FROM `balance_data` WHERE partner_name = 'from, mysql.user'",
+])
+def test_accepted(sql):
+    validate(sql, TABLES)
+
+class Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = [("n",)]
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append(sql)
+        if sql.startswith("SET SESSION MAX_EXECUTION_TIME") and self.conn.mariadb:
+            raise RuntimeError("Unknown system variable 'MAX_EXECUTION_TIME'")
+        if sql == "SELECT broken":
+            raise RuntimeError("query failed")
+
+    def fetchmany(self, size):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+class Connection:
+    def __init__(self, mariadb):
+        self.mariadb = mariadb
+        self.statements = []
+        self.in_transaction = False
+        self.unread_result = False
+
+    def get_server_info(self):
+        return "10.11.6-MariaDB" if self.mariadb else "8.0.36"
+
+    def cursor(self):
+        return Cursor(self)
+
+    def start_transaction(self, readonly=False):
+        pass
+
+    def rollback(self):
+        pass
+
+def test_mariadb_uses_max_statement_time():
+    conn = Connection(mariadb=True)
+    assert text_to_sql.run(conn, "SELECT 1", timeout_ms=2500) == (["n"], [{"n": 1}], False)
+    assert conn.statements[0] == "SET SESSION max_statement_time = %s"
+    assert conn.statements[-1] == "SET SESSION max_statement_time = DEFAULT"
+
+def test_query_error_is_reported():
+    with pytest.raises(RuntimeError, match="query failed"):
+        text_to_sql.run(Connection(mariadb=False), "SELECT broken")
@@ -0,0 +1,167 @@
+import os
+import re
+from numbers import Number
+
+SQL_ROW_LIMIT = int(os.getenv("SQL_ROW_LIMIT", "200"))
+SQL_TIMEOUT_MS = int(os.getenv("SQL_TIMEOUT_MS", "5000"))
+
+FORBIDDEN = re.compile(
+    r"\b(insert|update|delete|replace|merge|drop|alter|create|rename|truncate|grant|revoke|"
+    r"call|do|handler|load|lock|unlock|set|into|outfile|dumpfile|sleep|benchmark|get_lock|"
+    r"load_file|for\s+update|share\s+mode)\b",
+    re.IGNORECASE,
+)
+STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+TABLE_CLAUSE = re.compile(r"\b(?:from|join)\b", re.IGNORECASE)
+# words ending a FROM/JOIN table list
+TABLE_LIST_END = re.compile(
+    r"(?:where|group|having|order|limit|union|window|on|using|natural|inner|left|right|cross|full|"
+    r"straight_join|join|procedure|into|for|lock)\b", re.IGNORECASE)
+TABLE_NAME = re.compile(r"(?:`[^`]+`|[\w$]+)(?:\.(?:`[^`]+`|[\w$]+))?")
+CTE_NAME = re.compile(r"(?:\bwith\s+(?:recursive\s+)?|,\s*)([\w$]+)\s+as\s*\(", re.IGNORECASE)
+TRAILING_LIMIT = re.compile(r"\blimit\s+(\d+)(?:\s*,\s*(\d+)|\s+offset\s+\d+)?\s*$", re.IGNORECASE)
+
+class UnsafeSQL(ValueError):
+    pass
+
+# start of the innermost parenthesis around each position, -1 at top level
+def enclosing_parens(bare):
+    stack, inside = [], []
+    for i, c in enumerate(bare):
+        inside.append(stack[-1] if stack else -1)
+        if c == "(":
+            stack.append(i)
+        elif c == ")" and stack:
+            stack.pop()
+    return inside
+
+# every table named in a FROM or JOIN list, including comma-separated ones;
+# FROM inside a function call (EXTRACT(YEAR FROM d), TRIM(x FROM y)) is skipped
+def table_refs(bare):
+    inside = enclosing_parens(bare)
+    refs = []
+    for clause in TABLE_CLAUSE.finditer(bare):
+        paren = inside[clause.start()]
+        if paren >= 0 and not re.match(r"\(\s*(?:select|with)\b", bare[paren:], re.IGNORECASE):
+            continue
+        depth, start, i = 0, clause.end(), clause.end()
+        items = []
+        while i < len(bare):
+            c = bare[i]
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0 and c == ",":
+                items.append(bare[start:i])
+                start = i + 1
+            elif depth == 0 and not (bare[i - 1].isalnum() or bare[i - 1] in "_$`") and TABLE_LIST_END.match(bare, i):
+                break
+            i += 1
+        items.append(bare[start:i])
+        for item in items:
+            name = TABLE_NAME.match(item.strip())
+            if name:
+                refs.append(name.group(0))
+    return refs
+
+def sql_prompt(tables, question):
+    lines = [
+        f"{name}({', '.join(c['name'] + ' ' + c['type'] for c in info['columns'])})"
+        for name, info in tables.items()
+    ]
+    return (
+        "You write MySQL queries. Tables:\n" + "\n".join(lines) +
+        "\n\nWrite one read-only MySQL SELECT statement that answers the question. "
+        "Aggregate in SQL (SUM, COUNT, AVG, GROUP BY) instead of returning raw rows. "
+        "Reply with the SQL only, no explanation.\n\nQuestion:\n" + question
+    )
+
+def extract_sql(text):
+    fenced = re.search(r"```(?:sql)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    sql = fenced.group(1) if fenced else text
+    start = re.search(r"\b(select|with)\b", sql, re.IGNORECASE)
+    sql = sql[start.start():] if start else sql
+    return sql.strip().rstrip(";").strip()
+
+# Accepts a single SELECT (optionally with CTEs) over known tables and returns
+# it with its LIMIT capped at SQL_ROW_LIMIT + 1, so truncation stays visible.
+# Anything that could write, lock, sleep or read files is rejected; the
+# database user should still be read-only.
+def validate(sql, tables):
+    bare = STRINGS.sub("''", sql)
+    if not re.match(r"\s*(select|with)\b", bare, re.IGNORECASE):
+        raise UnsafeSQL("Only SELECT statements are allowed")
+    if ";" in bare:
+        raise UnsafeSQL("Only one statement is allowed")
+    if re.search(r"--|#|/\*", bare):
+        raise UnsafeSQL("Comments are not allowed")
+    found = FORBIDDEN.search(bare)
+    if found:
+        raise UnsafeSQL(f"{found.group(1).upper()} is not allowed")
+    known = {t.lower() for t in tables} | {n.lower() for n in CTE_NAME.findall(bare)}
+    for ref in table_refs(bare):
+        name = ref.strip("`").lower()
+        if name not in known:
+            raise UnsafeSQL(f"Unknown table {ref}")
+    cap = SQL_ROW_LIMIT + 1
+    limit = TRAILING_LIMIT.search(sql)
+    if not limit:
+        return f"{sql} LIMIT {cap}"
+    group = 2 if limit.group(2) else 1
+    if int(limit.group(group)) <= cap:
+        return sql
+    return sql[:limit.start(group)] + str(cap) + sql[limit.end(group):]
+
+# MySQL limits SELECTs with MAX_EXECUTION_TIME (ms); MariaDB has no such
+# variable and uses max_statement_time (seconds) instead
+def time_limit(conn, timeout_ms):
+    if "mariadb" in conn.get_server_info().lower():
+        return "max_statement_time", timeout_ms / 1000
+    return "MAX_EXECUTION_TIME", timeout_ms
+
+def query(conn, cur, sql, limit):
+    if conn.in_transaction:
+        conn.rollback()
+    conn.start_transaction(readonly=True)
+    try:
+        cur.execute(sql)
+        columns = [d[0] for d in cur.description]
+        rows = cur.fetchmany(limit + 1)
+        if conn.unread_result:
+            conn.consume_results()
+    finally:
+        conn.rollback()
+    return columns, rows
+
+# Runs the statement in a read-only transaction with a server-side time limit
+# and reads at most `limit` rows.
+def run(conn, sql, limit=SQL_ROW_LIMIT, timeout_ms=SQL_TIMEOUT_MS):
+    variable, value = time_limit(conn, timeout_ms)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SET SESSION {variable} = %s", (value,))
+        try:
+            columns, rows = query(conn, cur, sql, limit)
+        except Exception:
+            # the query's own error is the one worth reporting
+            try:
+                cur.execute(f"SET SESSION {variable} = DEFAULT")
+            except Exception:
+                pass
+            raise
+        cur.execute(f"SET SESSION {variable} = DEFAULT")
+    finally:
+        cur.close()
+    truncated = len(rows) > limit
+    return columns, [dict(zip(columns, r)) for r in rows[:limit]], truncated
+
+def result_kinds(columns, rows):
+    kinds = {}
+    for c in columns:
+        values = [r[c] for r in rows if r[c] is not None]
+        numeric = values and all(isinstance(v, Number) and not isinstance(v, bool) for v in values)
+        kinds[c] = "number" if numeric else "text"
+    return kinds
@@ -0,0 +1,123 @@
+import os
+import math
+import numpy as np
+import faiss
+
+# flat = exact brute force (reference for recall), ivf / hnsw = approximate
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+TOP_K = int(os.getenv("TOP_K", "50"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+FILTER_EXACT_LIMIT = int(os.getenv("FILTER_EXACT_LIMIT", "4096"))
+# map index files instead of reading them, so opening a large index is
+# near-instant and its pages load as searches touch them
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") == "1"
+
+# faiss warns below ~39 training points per centroid
+MIN_POINTS_PER_LIST = 39
+
+def ivf_nlist(n):
+    return min(IVF_NLIST, n // MIN_POINTS_PER_LIST)
+
+def new_index(dimension, vectors=None, kind=None):
+    kind = kind or INDEX_TYPE
+    if kind == "hnsw":
+        idx = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        idx.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return idx
+    if kind == "ivf" and vectors is not None and ivf_nlist(len(vectors)) >= 1:
+        idx = faiss.index_factory(dimension, f"IVF{ivf_nlist(len(vectors))},Flat")
+        idx.train(np.ascontiguousarray(vectors, dtype="float32"))
+        return idx
+    return faiss.IndexFlatL2(dimension)
+
+# IVF files ("Iw..." headers) map their inverted lists with IO_FLAG_MMAP;
+# flat and HNSW storage is only mapped by IO_FLAG_MMAP_IFC, which older faiss
+# builds lack. Anything that cannot be mapped is read normally.
+def read_index(path):
+    if INDEX_MMAP:
+        with open(path, "rb") as f:
+            header = f.read(4)
+        flag = faiss.IO_FLAG_MMAP if header.startswith(b"Iw") else getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        if flag:
+            try:
+                return faiss.read_index(path, flag)
+            except RuntimeError:
+                pass
+    return faiss.read_index(path)
+
+def all_vectors(index):
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+# builds one index from vectors that arrive in batches; an ivf index is only
+# trained once enough vectors have arrived (or the input ends)
+class IndexBuilder:
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.index = None
+        self.pending = []
+        self.pending_rows = 0
+
+    def add(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self.index is not None:
+            self.index.add(vectors)
+            return
+        self.pending.append(vectors)
+        self.pending_rows += len(vectors)
+        if INDEX_TYPE != "ivf" or self.pending_rows >= IVF_NLIST * MIN_POINTS_PER_LIST:
+            self.flush()
+
+    def flush(self):
+        vectors = np.vstack(self.pending) if self.pending else np.zeros((0, self.dimension), dtype="float32")
+        self.index = new_index(self.dimension, vectors)
+        self.index.add(vectors)
+        self.pending, self.pending_rows = [], 0
+
+    def finish(self):
+        if self.index is None:
+            self.flush()
+        return self.index
+
+def search_params(index, k, sel=None, candidates=None):
+    # a filter leaves fewer live vectors per probed list / graph neighbourhood,
+    # so the search is widened in proportion to how selective it is
+    widen = index.ntotal / candidates if candidates else 1
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=min(index.nlist, math.ceil(IVF_NPROBE * widen)))
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=min(index.ntotal, math.ceil(max(HNSW_EF_SEARCH, k) * widen)))
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+def exact_search(index, q_emb, k, ids):
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    vectors = index.reconstruct_batch(ids)
+    dists = ((vectors - q_emb[0]) ** 2).sum(axis=1)
+    top = np.argsort(dists, kind="stable")[:k]
+    return dists[top][None, :].astype("float32"), ids[top][None, :]
+
+def search(index, q_emb, k=TOP_K, ids=None):
+    total = index.ntotal if ids is None else len(ids)
+    k = min(k, total)
+    if k <= 0:
+        return np.zeros((1, 0), dtype="float32"), np.zeros((1, 0), dtype="int64")
+    q_emb = np.ascontiguousarray(q_emb, dtype="float32")
+    if ids is None:
+        return index.search(q_emb, k, params=search_params(index, k))
+    ids = np.ascontiguousarray(ids, dtype="int64")
+    # approximate indexes can miss survivors of a very selective filter, so
+    # small candidate sets are ranked exactly
+    if len(ids) <= FILTER_EXACT_LIMIT and not isinstance(index, faiss.IndexFlat):
+        return exact_search(index, q_emb, k, ids)
+    sel = faiss.IDSelectorBatch(ids)
+    return index.search(q_emb, k, params=search_params(index, k, sel, len(ids)))
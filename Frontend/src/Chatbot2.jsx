@@ -5,6 +5,7 @@ import { useTranslation } from "react-i18next";
 import ReactMarkdown from "react-markdown";
 import MyChartComponent from "./MyChartComponent";
 import MySQLCredentialsModal from "./MySQLCredentialsModal";
+import { streamQuery } from "./streamQuery";
 
 import './styles2/2/layout.css';
 import './styles2/2/chatbox.css';
@@ -18,6 +19,8 @@ const Chatbot = () => {
   const [isLoading, setIsLoading] = useState(false);
   const { t, i18n } = useTranslation();
   const [tableData, setTableData] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [sqlMode, setSqlMode] = useState(false);
   const [selectedRows, setSelectedRows] = useState([]);
   const [tableList, setTableList] = useState([]);
   const [currentTableIndex, setCurrentTableIndex] = useState(0);
@@ -26,32 +29,44 @@ const Chatbot = () => {
 
   useEffect(() => {
     setMessages([{ sender: "bot", text: t("welcomeMessage") }]);
-    fetchTableList();
   }, [t]);
 
+  useEffect(() => {
+    fetchTableList();
+  }, []);
+
   useEffect(() => {
     if (tableList.length > 0) fetchTableData(tableList[currentTableIndex]);
   }, [tableList, currentTableIndex]);
 
   const fetchTableList = async () => {
     try {
-      const response = await axios.get("http://localhost:8000/get_table_list");
-      setTableList(response.data);
+      const response = await axios.get("http://localhost:8000/schema");
+      setTableList(Object.keys(response.data.tables));
     } catch (error) {
       console.error("Error fetching table list:", error);
     }
   };
 
-  const fetchTableData = async (tableName) => {
+  const fetchTableData = async (tableName, after = null) => {
     try {
-      const response = await axios.get(`http://localhost:8000/get_mysql_data/${tableName}`);
-      setTableData(response.data);
-      setSelectedRows([]);
+      const response = await axios.get(`http://localhost:8000/get_mysql_data/${tableName}`, {
+        params: after ? { after } : {},
+      });
+      setTableData((prev) => (after ? [...prev, ...response.data.rows] : response.data.rows));
+      setNextCursor(response.data.next_cursor);
+      if (!after) setSelectedRows([]);
     } catch (error) {
       console.error("Error fetching table data:", error);
     }
   };
 
+  const loadMoreRows = () => {
+    if (nextCursor && tableList.length > 0) {
+      fetchTableData(tableList[currentTableIndex], nextCursor);
+    }
+  };
+
   const refreshTable = () => {
     if (tableList.length > 0) {
       fetchTableData(tableList[currentTableIndex]);
@@ -95,21 +110,34 @@ const Chatbot = () => {
     setIsLoading(true);
 
     try {
-      const response = await axios.post("http://localhost:8000/query_mysql_ai", {
+      let botText = "";
+      let extras = { chartData: null, imageUrl: null, sql: null };
+      const showAnswer = () => {
+        setMessages([...newMessages, { sender: "bot", text: botText || t("noResponseMessage"), ...extras }]);
+      };
+      await streamQuery("http://localhost:8000/query_mysql_ai/stream", {
         query: input,
-        selectedRows: selectedRows
+        selectedRows: sqlMode ? [] : selectedRows,
+        table: tableList[currentTableIndex],
+        mode: sqlMode ? "sql" : "rows"
+      }, (event, data) => {
+        if (event === "sql") {
+          extras = { ...extras, sql: data.sql };
+        } else if (event === "token") {
+          botText += data.text;
+          setIsLoading(false);
+          showAnswer();
+        } else if (event === "done") {
+          extras = {
+            ...extras,
+            chartData: data.chartData || null,
+            imageUrl: data.imageUrl || null
+          };
+        } else if (event === "error") {
+          throw new Error(data.detail);
+        }
       });
-
-      const { response: botText, chartData, imageBase64 } = response.data;
-
-      const botMessage = {
-        sender: "bot",
-        text: botText || t("noResponseMessage"),
-        chartData: chartData || null,
-        imageBase64: imageBase64 || null
-      };
-
-      setMessages([...newMessages, botMessage]);
+      showAnswer();
     } catch (error) {
       console.error("Error fetching response:", error);
       setMessages([...newMessages, { sender: "bot", text: t("errorMessage") }]);
@@ -160,15 +188,19 @@ const Chatbot = () => {
                     ? <ReactMarkdown>{msg.text}</ReactMarkdown>
                     : msg.text)}
 
+                  {msg.sql && (
+                    <pre style={{ whiteSpace: "pre-wrap", fontSize: "0.85em", marginTop: "10px" }}>{msg.sql}</pre>
+                  )}
+
                   {msg.chartData && (
                     <div style={{ maxWidth: "100%" }}>
                       <MyChartComponent data={msg.chartData} />
                     </div>
                   )}
 
-                  {msg.imageBase64 && (
+                  {msg.imageUrl && (
                     <img
-                      src={`data:image/png;base64,${msg.imageBase64}`}
+                      src={`http://localhost:8000${msg.imageUrl}`}
                       alt="Graph"
                       style={{ maxWidth: "100%", marginTop: "10px" }}
                     />
@@ -192,6 +224,10 @@ const Chatbot = () => {
               onKeyDown={(e) => e.key === "Enter" && handleSend()}
               className="custom-input"
             />
+            <label style={{ display: "flex", alignItems: "center", gap: "4px", whiteSpace: "nowrap" }}>
+              <input type="checkbox" checked={sqlMode} onChange={(e) => setSqlMode(e.target.checked)} />
+              {t("askDatabase")}
+            </label>
             <button onClick={handleSend} className="custom-button" disabled={isLoading}>
               {isLoading ? t("sending") + "..." : t("sendButton")}
             </button>
@@ -240,6 +276,9 @@ const Chatbot = () => {
 
           <div style={{ display: "flex", gap: "10px", marginTop: "10px" }}>
             <button onClick={refreshTable} className="custom-button">{t("refreshData")}</button>
+            {nextCursor && (
+              <button onClick={loadMoreRows} className="custom-button">{t("loadMore")}</button>
+            )}
             <button onClick={selectAllRows} className="custom-button">{t("selectAll")}</button>
             <button onClick={() => setSelectedRows([])} className="custom-button">{t("deselectAll")}</button>
             <button onClick={goToPreviousTable} className="custom-button">{t("prevTable")}</button>
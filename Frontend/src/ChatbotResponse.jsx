@@ -3,6 +3,7 @@ import { Link } from "react-router-dom";
 import axios from "axios";
 import { useTranslation } from "react-i18next";
 import ReactMarkdown from "react-markdown";
+import { streamQuery } from "./streamQuery";
 
 import './styles/1/base.css';
 import './styles/1/theme.css';
@@ -32,12 +33,27 @@ const Chatbot = () => {
     setIsLoading(true);
 
     try {
-      const response = await axios.post("http://localhost:8000/query", { query: input });
-      const botResponse = t("responseMessage", {
-        response: response.data.response,
-        context: JSON.stringify(response.data.context),
+      let answer = "";
+      let context = "";
+      const showAnswer = () => {
+        const botResponse = t("responseMessage", {
+          response: answer,
+          context: JSON.stringify(context),
+        });
+        setMessages([...newMessages, { sender: "bot", text: botResponse }]);
+      };
+      await streamQuery("http://localhost:8000/query/stream", { query: input }, (event, data) => {
+        if (event === "context") {
+          context = data.context;
+        } else if (event === "token") {
+          answer += data.text;
+          setIsLoading(false);
+          showAnswer();
+        } else if (event === "error") {
+          throw new Error(data.detail);
+        }
       });
-      setMessages([...newMessages, { sender: "bot", text: botResponse }]);
+      showAnswer();
     } catch (error) {
       console.error("Error:", error);
       setMessages([...newMessages, { sender: "bot", text: t("errorMessage") }]);
@@ -46,6 +62,15 @@ const Chatbot = () => {
     }
   };
 
+  const waitForIngestJob = async (jobId) => {
+    while (true) {
+      const { data } = await axios.get(`http://localhost:8000/jobs/${jobId}`);
+      if (data.status === "done") return data;
+      if (data.status === "failed") throw new Error(data.error);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleFileUpload = async (e) => {
     const uploadedFile = e.target.files[0];
     if (!uploadedFile || isUploading) return;
@@ -56,9 +81,10 @@ const Chatbot = () => {
 
     try {
       setIsUploading(true);
-      await axios.post("http://localhost:8000/upload_csv", formData, {
+      const response = await axios.post("http://localhost:8000/upload_csv", formData, {
         headers: { "Content-Type": "multipart/form-data" },
       });
+      await waitForIngestJob(response.data.job_id);
       alert(t("uploadSuccessMessage"));
     } catch (error) {
       console.error("File upload error:", error);
@@ -7,7 +7,7 @@ ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend)
 const MyChartComponent = ({ data }) => {
   const chartData = {
     labels: data.labels,
-    datasets: [
+    datasets: data.datasets || [
       {
         label: data.label || "Chart",
         data: data.values,